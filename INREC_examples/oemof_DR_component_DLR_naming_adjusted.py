@@ -24,18 +24,24 @@ are matched.
 A special thank you goes to Julian Endres and the oemof developping team at RLI.
 """
 
-from numpy import mean
+import numpy as np
 
 from collections import abc
 from pyomo.core.base.block import SimpleBlock
 from pyomo.environ import (Set, NonNegativeReals, Var, Constraint,
-                           BuildAction, Expression)
+                           BuildAction, Expression, quicksum)
+from pyomo.core.expr.numeric_expr import LinearExpression
 
 from oemof.solph.network import Sink
 from oemof.solph.plumbing import sequence
 from oemof.solph import Investment
 
 
+def _mean(arr):
+    """Return the mean of an array as a float, skipping scalars"""
+    return float(arr.mean()) if arr.ndim else float(arr)
+
+
 class SinkDR(Sink):
     r""" A special Sink component which modifies the input demand series used
     to model demand response units for load shifting and shedding.
@@ -110,9 +116,19 @@ class SinkDR(Sink):
         self.cost_dsm_down_shed = cost_dsm_down_shed
         self.efficiency = efficiency
 
-        # calculate mean values
-        self.capacity_down_mean = mean(capacity_down)
-        self.capacity_up_mean = mean(capacity_up)
+        # raw demand and capacity values as arrays for building the
+        # constraints (scalars are broadcast to the timesteps in the block)
+        self._demand_arr = np.asarray(demand, dtype=np.float64)
+        self._capacity_down_arr = np.asarray(capacity_down, dtype=np.float64)
+        self._capacity_up_arr = np.asarray(capacity_up, dtype=np.float64)
+
+        # calculate mean values (as plain floats; no reduction for scalars)
+        self.capacity_down_mean = _mean(self._capacity_down_arr)
+        self.capacity_up_mean = _mean(self._capacity_up_arr)
+
+        # energy limits for shifting used in the storage and day limits
+        self._limit_red = self.capacity_down_mean * shift_time
+        self._limit_inc = self.capacity_up_mean * shift_time
 
         # Optionally include year resp. day limits for shifted / shedded energy
         # Introduction of these is controlled through boolean control parameters
@@ -223,14 +239,30 @@ class SinkDRBlock(SimpleBlock):
 
         m = self.parent_block()
 
+        # plain tuples of the units and timesteps; iterating these in the
+        # rules avoids going through the pyomo Set iteration every time
+        group = tuple(group)
+        timesteps = tuple(m.TIMESTEPS)
+
         # for all DR components get inflow from bus_elec
         for n in group:
-            n.inflow = list(n.inputs)[0]
+            n.inflow = next(iter(n.inputs))
 
         #  ************* SETS *********************************
 
         # Set of DR Components
-        self.DR = Set(initialize=[n for n in group])
+        self.DR = Set(initialize=group)
+
+        # Sparse index of the rolling sums: only units with an active day
+        # limit (no variables are created for all other units)
+        self.DR_DAY = Set(
+            dimen=2,
+            initialize=[(g, t) for g in group if g.ActivateDayLimit
+                        for t in timesteps])
+
+        # Set of DR Components with an active year limit
+        self.DR_YEAR = Set(
+            initialize=[g for g in group if g.ActivateYearLimit])
 
         #  ************* VARIABLES *****************************
 
@@ -269,36 +301,122 @@ class SinkDRBlock(SimpleBlock):
         self.dsm_up_level = Var(self.DR, m.TIMESTEPS, initialize=0,
                               within=NonNegativeReals)
 
-        #  ************* CONSTRAINTS *****************************
-
-        def _shift_shed_vars_rule(block):
-            """
-            Force shifting resp. shedding variables to zero dependent
-            on how boolean parameters for shift resp. shed eligibility
-            are set.
-            """
-            for t in m.TIMESTEPS:
-                for g in group:
-    
-                    if not g.shift_eligibility:
-                        # Memo: By forcing dsm_do_shift for shifting to zero, dsm up should
-                        # implicitly be forced to zero as well, since otherwhise,
-                        # constraints below would not hold ...
-                        lhs = self.dsm_do_shift[g, t]
-                        rhs = 0
-
-                        block.shift_shed_vars.add((g, t), (lhs == rhs))
+        # Variables for the rolling sum of downwards resp. upwards shifts
+        # over the last t_dayLimit timesteps (only for units with day limit)
+        self.dsm_do_shift_window = Var(self.DR_DAY, initialize=0,
+                                       within=NonNegativeReals)
+        self.dsm_up_window = Var(self.DR_DAY, initialize=0,
+                                 within=NonNegativeReals)
+
+        # Variables for the total downwards resp. upwards shifts over the
+        # optimization timeframe (only for units with year limit)
+        self.dsm_do_shift_total = Var(self.DR_YEAR, initialize=0,
+                                      within=NonNegativeReals)
+        self.dsm_up_total = Var(self.DR_YEAR, initialize=0,
+                                within=NonNegativeReals)
 
-                    if not g.shed_eligibility:
-                        lhs = self.dsm_do_shed[g, t]
-                        rhs = 0
+        #  ************* CONSTRAINTS *****************************
 
-                        block.shift_shed_vars.add((g, t), (lhs == rhs))
-    
-        self.shift_shed_vars = Constraint(group, m.TIMESTEPS,
-                                          noruleinit=True)
-        self.shift_shed_vars_build = BuildAction(
-            rule=_shift_shed_vars_rule)
+        # Local references used within the constraint rules below
+        # (avoids repeated attribute lookups in the inner loops)
+        t_first = timesteps[0]
+        t_last = timesteps[-1]
+        dt = [float(m.timeincrement[t]) for t in timesteps]
+        # flow variable data keyed by (source, target, t); looking up the
+        # dict directly skips the index coercion of IndexedComponent
+        flow_data = m.flow._data
+        dsm_do_shift = self.dsm_do_shift
+        dsm_do_shed = self.dsm_do_shed
+        dsm_up = self.dsm_up
+        balance_dsm_do = self.balance_dsm_do
+        balance_dsm_up = self.balance_dsm_up
+        dsm_do_level = self.dsm_do_level
+        dsm_up_level = self.dsm_up_level
+        dsm_do_shift_window = self.dsm_do_shift_window
+        dsm_up_window = self.dsm_up_window
+        dsm_do_shift_total = self.dsm_do_shift_total
+        dsm_up_total = self.dsm_up_total
+
+        # Per-unit lists of the variables, indexed by timestep (avoids
+        # repeated IndexedVar.__getitem__ calls for the same variables
+        # within the rules below)
+        do_shift_vars = {g: [dsm_do_shift[g, t] for t in timesteps]
+                         for g in group}
+        shed_vars = {g: [dsm_do_shed[g, t] for t in timesteps]
+                     for g in group}
+        bal_do_vars = {g: [balance_dsm_do[g, t] for t in timesteps]
+                       for g in group}
+        bal_up_vars = {g: [balance_dsm_up[g, t] for t in timesteps]
+                       for g in group}
+        up_vars = {g: [dsm_up[g, t] for t in timesteps] for g in group}
+        do_level_vars = {g: [dsm_do_level[g, t] for t in timesteps]
+                         for g in group}
+        up_level_vars = {g: [dsm_up_level[g, t] for t in timesteps]
+                         for g in group}
+        do_window_vars = {g: [dsm_do_shift_window[g, t] for t in timesteps]
+                          for g in group if g.ActivateDayLimit}
+        up_window_vars = {g: [dsm_up_window[g, t] for t in timesteps]
+                          for g in group if g.ActivateDayLimit}
+
+        def _timestep_array(arr):
+            """Return a unit parameter as an array with one value per timestep"""
+            if arr.ndim == 0:
+                return np.full(len(timesteps), float(arr))
+            return arr[:len(timesteps)]
+
+        # Per-unit parameter arrays with exactly one entry per timestep
+        # (timesteps run from 0 to T-1, so t doubles as position)
+        demand_arrs = {g: _timestep_array(g._demand_arr) for g in group}
+        capacity_down_arrs = {g: _timestep_array(g._capacity_down_arr)
+                              for g in group}
+        capacity_up_arrs = {g: _timestep_array(g._capacity_up_arr)
+                            for g in group}
+        # maximum capacity eligibly for load shifting (logical constraint)
+        capacity_max_arrs = {g: np.maximum(capacity_down_arrs[g],
+                                           capacity_up_arrs[g])
+                             for g in group if g.addition}
+
+        # Fix shifting resp. shedding variables to zero dependent
+        # on how boolean parameters for shift resp. shed eligibility
+        # are set. Fixed variables drop out of the LP entirely, so no
+        # constraints are needed (and none are built if all units are
+        # eligible for both).
+        for g in group:
+
+            if not g.shift_eligibility:
+                for t in timesteps:
+                    # Memo: dsm_up would otherwise only implicitly be
+                    # forced to zero through the constraints below
+                    dsm_do_shift[g, t].fix(0)
+                    dsm_up[g, t].fix(0)
+                    # if only shedding is possible, balancing variables
+                    # can be forced to 0 as well
+                    balance_dsm_do[g, t].fix(0)
+                    balance_dsm_up[g, t].fix(0)
+
+            if not g.shed_eligibility:
+                for t in timesteps:
+                    dsm_do_shed[g, t].fix(0)
+
+        # Units without any capacity cannot shift or shed at all. All of
+        # their DR variables are fixed to zero and they only take part in
+        # the input/output relation.
+        active_group = tuple(g for g in group
+                             if capacity_down_arrs[g].any()
+                             or capacity_up_arrs[g].any())
+
+        for g in group:
+
+            if g not in active_group:
+                for var_lists in (do_shift_vars, shed_vars, up_vars,
+                                  bal_do_vars, bal_up_vars, do_level_vars,
+                                  up_level_vars, do_window_vars,
+                                  up_window_vars):
+                    for var in var_lists.get(g, ()):
+                        var.fix(0)
+                if g.ActivateYearLimit:
+                    dsm_do_shift_total[g].fix(0)
+                    dsm_up_total[g].fix(0)
 
         # Relation between inflow and effective Sink consumption
         def _input_output_relation_rule(block):
@@ -307,20 +425,30 @@ class SinkDRBlock(SimpleBlock):
             The actual demand after DR.
             Bus outflow == Demand +- DR (i.e. effective Sink consumption)
             """
-
-            for t in m.TIMESTEPS:
-                for g in group:
-                    # outflow from bus
-                    lhs = m.flow[g.inflow, g, t]
-
-                    # Demand +- DR
-                    rhs = g.demand[t] \
-                          + self.dsm_up[g, t] + self.balance_dsm_do[g, t] \
-                          - self.dsm_do_shift[g, t] - self.balance_dsm_up[g, t] \
-                          - self.dsm_do_shed[g, t]
+            for g in group:
+                inflow = g.inflow
+                demand = demand_arrs[g].tolist()
+
+                up = up_vars[g]
+                do_shift = do_shift_vars[g]
+                bal_do = bal_do_vars[g]
+                bal_up = bal_up_vars[g]
+                shed = shed_vars[g]
+
+                for t in timesteps:
+                    # outflow from bus -+ DR (all variables on the lhs)
+                    lhs = LinearExpression(
+                        constant=0.0,
+                        linear_coefs=[1.0, -1.0, -1.0, 1.0, 1.0, 1.0],
+                        linear_vars=[flow_data[inflow, g, t],
+                                     up[t], bal_do[t], do_shift[t],
+                                     bal_up[t], shed[t]])
+
+                    # Demand
+                    rhs = demand[t]
 
                     # add constraint
-                    block.input_output_relation.add((g, t), (lhs == rhs))
+                    block.input_output_relation.add((g, t), (rhs, lhs, rhs))
 
         self.input_output_relation = Constraint(group, m.TIMESTEPS,
                                                 noruleinit=True)
@@ -329,41 +457,39 @@ class SinkDRBlock(SimpleBlock):
 
         # Equation 4.8
         def capacity_balance_red_rule(block):
-            """ 
+            """
             Load reduction must be balanced by load increase within delay_time
             """
-            for t in m.TIMESTEPS:
-                for g in group:
-
-                    if g.shift_eligibility:
-
-                        # main use case
-                        if t >= g.delay_time:
-                            # balance load reduction
-                            lhs = self.balance_dsm_do[g, t]
-
-                            # load reduction (efficiency considered)
-                            rhs = self.dsm_do_shift[g, t - g.delay_time] / g.efficiency
-
-                            # add constraint
-                            block.capacity_balance_red.add((g, t), (lhs == rhs))
+            for g in active_group:
+                # balancing variables are fixed to 0 if shifting is
+                # not possible
+                if not g.shift_eligibility:
+                    continue
+
+                delay_time = g.delay_time
+                efficiency = g.efficiency
+                bal_do = bal_do_vars[g]
+                do_shift = do_shift_vars[g]
+
+                # no balancing for the first timestep
+                if delay_time > 0:
+                    t = t_first
+                    lhs = bal_do[t]
+                    rhs = 0
+
+                    block.capacity_balance_red.add((g, t), (lhs == rhs))
+
+                # main use case: pair each timestep with the one
+                # delay_time steps before it
+                for t, t_shift in zip(timesteps[delay_time:], timesteps):
+                    # balance load reduction
+                    lhs = bal_do[t]
+
+                    # load reduction (efficiency considered)
+                    rhs = do_shift[t_shift] / efficiency
 
-                        # no balancing for the first timestep
-                        elif t == m.TIMESTEPS[1]:
-                            lhs = self.balance_dsm_do[g, t]
-                            rhs = 0
-
-                            block.capacity_balance_red.add((g, t), (lhs == rhs))
-
-                        else:
-                            pass  # return(Constraint.Skip)
-
-                    # if only shedding is possible, balancing variable can be forced to 0
-                    else:
-                        lhs = self.balance_dsm_do[g, t]
-                        rhs = 0
-
-                        block.capacity_balance_red.add((g, t), (lhs == rhs))
+                    # add constraint
+                    block.capacity_balance_red.add((g, t), (lhs == rhs))
 
         self.capacity_balance_red = Constraint(group, m.TIMESTEPS,
                                                noruleinit=True)
@@ -372,41 +498,39 @@ class SinkDRBlock(SimpleBlock):
 
         # Equation 4.9
         def capacity_balance_inc_rule(block):
-            """ 
+            """
             Load increased must be balanced by load reduction within delay_time
             """
-            for t in m.TIMESTEPS:
-                for g in group:
-
-                        if g.shift_eligibility:
+            for g in active_group:
+                # balancing variables are fixed to 0 if shifting is
+                # not possible
+                if not g.shift_eligibility:
+                    continue
+
+                delay_time = g.delay_time
+                efficiency = g.efficiency
+                bal_up = bal_up_vars[g]
+                up = up_vars[g]
+
+                # no balancing for the first timestep
+                if delay_time > 0:
+                    t = t_first
+                    lhs = bal_up[t]
+                    rhs = 0
+
+                    block.capacity_balance_inc.add((g, t), (lhs == rhs))
+
+                # main use case: pair each timestep with the one
+                # delay_time steps before it
+                for t, t_shift in zip(timesteps[delay_time:], timesteps):
+                    # balance load increase
+                    lhs = bal_up[t]
+
+                    # load increase (efficiency considered)
+                    rhs = up[t_shift] * efficiency
 
-                            # main use case
-                            if t >= g.delay_time:
-                                # balance load increase
-                                lhs = self.balance_dsm_up[g, t]
-
-                                # load increase (efficiency considered)
-                                rhs = self.dsm_up[g, t - g.delay_time] * g.efficiency
-
-                                # add constraint
-                                block.capacity_balance_inc.add((g, t), (lhs == rhs))
-
-                            # no balancing for the first timestep
-                            elif t == m.TIMESTEPS[1]:
-                                lhs = self.balance_dsm_up[g, t]
-                                rhs = 0
-
-                                block.capacity_balance_inc.add((g, t), (lhs == rhs))
-
-                            else:
-                                pass  # return(Constraint.Skip)
-
-                        # if only shedding is possible, balancing variable can be forced to 0
-                        else:
-                            lhs = self.balance_dsm_up[g, t]
-                            rhs = 0
-
-                            block.capacity_balance_inc.add((g, t), (lhs == rhs))
+                    # add constraint
+                    block.capacity_balance_inc.add((g, t), (lhs == rhs))
 
         self.capacity_balance_inc = Constraint(group,  m.TIMESTEPS,
                                                noruleinit=True)
@@ -419,10 +543,10 @@ class SinkDRBlock(SimpleBlock):
         #     Prevent downwards shifts that cannot be balanced anymore
         #     within the optimization timeframe
         #     """
-        #     for t in m.TIMESTEPS:
+        #     for t in timesteps:
         #         for g in group:
         #
-        #             if t > m.TIMESTEPS[-1] - g.delay_time:
+        #             if t > t_last - g.delay_time:
         #                 # no load reduction anymore (dsm_do_shift = 0)
         #                 lhs = self.dsm_do_shift[g, t]
         #                 rhs = 0
@@ -440,10 +564,10 @@ class SinkDRBlock(SimpleBlock):
         #     Prevent upwards shifts that cannot be balanced anymore
         #     within the optimization timeframe
         #     """
-        #     for t in m.TIMESTEPS:
+        #     for t in timesteps:
         #         for g in group:
         #
-        #             if t > m.TIMESTEPS[-1] - g.delay_time:
+        #             if t > t_last - g.delay_time:
         #                 # no load increase anymore (dsm_up = 0)
         #                 lhs = self.dsm_up[g, t]
         #                 rhs = 0
@@ -456,23 +580,33 @@ class SinkDRBlock(SimpleBlock):
 
         # Equation 4.11
         def availability_red_rule(block):
-            """ 
+            """
             Load reduction must be smaller than or equal to the
             (time-dependent) capacity limit
             """
-
-            for t in m.TIMESTEPS:
-                for g in group:
-
+            for g in active_group:
+                capacity_down = capacity_down_arrs[g].tolist()
+                do_shift = do_shift_vars[g]
+                bal_up = bal_up_vars[g]
+                shed = shed_vars[g]
+
+                # no capacity: fix the variables instead of adding a row
+                for t in np.flatnonzero(capacity_down_arrs[g] == 0).tolist():
+                    do_shift[t].fix(0)
+                    bal_up[t].fix(0)
+                    shed[t].fix(0)
+
+                for t in np.flatnonzero(capacity_down_arrs[g]).tolist():
                     # load reduction
-                    lhs = self.dsm_do_shift[g, t] + self.balance_dsm_up[g, t] \
-                          + self.dsm_do_shed[g, t]
+                    lhs = LinearExpression(
+                        constant=0.0, linear_coefs=[1.0, 1.0, 1.0],
+                        linear_vars=[do_shift[t], bal_up[t], shed[t]])
 
                     # upper bound
-                    rhs = g.capacity_down[t]
+                    rhs = capacity_down[t]
 
                     # add constraint
-                    block.availability_red.add((g, t), (lhs <= rhs))
+                    block.availability_red.add((g, t), (None, lhs, rhs))
 
         self.availability_red = Constraint(group, m.TIMESTEPS,
                                            noruleinit=True)
@@ -481,62 +615,89 @@ class SinkDRBlock(SimpleBlock):
 
         # Equation 4.12
         def availability_inc_rule(block):
-            """ 
+            """
             Load increase must be smaller than or equal to the
             (time-dependent) capacity limit
             """
+            for g in active_group:
+                capacity_up = capacity_up_arrs[g].tolist()
+                up = up_vars[g]
+                bal_do = bal_do_vars[g]
 
-            for t in m.TIMESTEPS:
-                for g in group:
+                # no capacity: fix the variables instead of adding a row
+                for t in np.flatnonzero(capacity_up_arrs[g] == 0).tolist():
+                    up[t].fix(0)
+                    bal_do[t].fix(0)
 
+                for t in np.flatnonzero(capacity_up_arrs[g]).tolist():
                     # load increase
-                    lhs = self.dsm_up[g, t] + self.balance_dsm_do[g, t]
+                    lhs = LinearExpression(
+                        constant=0.0, linear_coefs=[1.0, 1.0],
+                        linear_vars=[up[t], bal_do[t]])
 
                     # upper bound
-                    rhs = g.capacity_up[t]
+                    rhs = capacity_up[t]
 
                     # add constraint
-                    block.availability_inc.add((g, t), (lhs <= rhs))
+                    block.availability_inc.add((g, t), (None, lhs, rhs))
 
         self.availability_inc = Constraint(group, m.TIMESTEPS,
                                            noruleinit=True)
         self.availability_inc_build = BuildAction(
             rule=availability_inc_rule)
 
-        # Equation 4.13
-        def dr_storage_red_rule(block):
-            """ 
-            Fictious demand response storage level for load reductions
-            transition equation
+        # Equations 4.13 and 4.14
+        def dr_storage_rule(block):
             """
+            Fictious demand response storage levels for load reductions
+            and load increases transition equations
+            """
+            for g in active_group:
+                efficiency = g.efficiency
+                do_shift = do_shift_vars[g]
+                up = up_vars[g]
+                do_level = do_level_vars[g]
+                up_level = up_level_vars[g]
+                bal_do = bal_do_vars[g]
+                bal_up = bal_up_vars[g]
+
+                # initial storage levels (no storage level prior to t = 0)
+                t = t_first
+                lhs = do_level[t]
+                rhs = dt[0] * do_shift[t]
+                block.dr_storage_red.add((g, t), (lhs == rhs))
+
+                lhs = up_level[t]
+                rhs = dt[0] * up[t]
+                block.dr_storage_inc.add((g, t), (lhs == rhs))
+
+                for t, t_prev, dt_t in zip(timesteps[1:], timesteps, dt[1:]):
+                    # reduction minus balancing of reductions
+                    lhs = dt_t * (do_shift[t]
+                                  - bal_do[t] * efficiency)
+
+                    # load reduction storage level transition
+                    rhs = do_level[t] - do_level[t_prev]
 
-            for t in m.TIMESTEPS:
-                for g in group:
-
-                    # avoid timesteps prior to t = 0
-                    if t > 0:
-                        # reduction minus balancing of reductions
-                        lhs = m.timeincrement[t] * (self.dsm_do_shift[g, t]
-                                                    - self.balance_dsm_do[g, t]
-                                                    * g.efficiency)
-
-                        # load reduction storage level transition
-                        rhs = self.dsm_do_level[g, t] - self.dsm_do_level[g, t - 1]
+                    # add constraint
+                    block.dr_storage_red.add((g, t), (lhs == rhs))
 
-                        # add constraint
-                        block.dr_storage_red.add((g, t), (lhs == rhs))
+                    # increases minus balancing of reductions
+                    lhs = dt_t * (up[t] * efficiency
+                                  - bal_up[t])
 
-                    else:
-                        # pass  # return(Constraint.Skip)
-                        lhs = self.dsm_do_level[g, t]
-                        rhs = m.timeincrement[t] * self.dsm_do_shift[g, t]
+                    # load increase storage level transition
+                    rhs = up_level[t] - up_level[t_prev]
 
-                        block.dr_storage_red.add((g, t), (lhs == rhs))
+                    # add constraint
+                    block.dr_storage_inc.add((g, t), (lhs == rhs))
 
         self.dr_storage_red = Constraint(group, m.TIMESTEPS,
                                          noruleinit=True)
-        self.dr_storage_red_build = BuildAction(
-            rule=dr_storage_red_rule)
+        self.dr_storage_inc = Constraint(group, m.TIMESTEPS,
+                                         noruleinit=True)
+        self.dr_storage_build = BuildAction(
+            rule=dr_storage_rule)
 
         # # Own addition: Storage roundtrip
         # def dr_storage_roundtrip_red_rule(block):
@@ -545,10 +706,10 @@ class SinkDRBlock(SimpleBlock):
         #     """
         #     for g in group:
         #         # first storage level
-        #         lhs = self.dsm_do_level[g, m.TIMESTEPS[1]]
+        #         lhs = self.dsm_do_level[g, t_first]
         #
         #         # last storage level
-        #         rhs = self.dsm_do_level[g, m.TIMESTEPS[-1]]
+        #         rhs = self.dsm_do_level[g, t_last]
         #
         #         # add constraint
         #         block.dr_storage_roundtrip_red.add(g, (lhs == rhs))
@@ -557,40 +718,6 @@ class SinkDRBlock(SimpleBlock):
         # self.dr_storage_roundtrip_red_build = BuildAction(
         #     rule=dr_storage_roundtrip_red_rule)
 
-        # Equation 4.14
-        def dr_storage_inc_rule(block):
-            """
-            Fictious demand response storage level for load increase
-            transition equation
-            """
-
-            for t in m.TIMESTEPS:
-                for g in group:
-
-                    # avoid timesteps prior to t = 0
-                    if t > 0:
-                        # increases minus balancing of reductions
-                        lhs = m.timeincrement[t] * (self.dsm_up[g, t]
-                                                    * g.efficiency
-                                                    - self.balance_dsm_up[g, t])
-
-                        # load increase storage level transition
-                        rhs = self.dsm_up_level[g, t] - self.dsm_up_level[g, t - 1]
-
-                        # add constraint
-                        block.dr_storage_inc.add((g, t), (lhs == rhs))
-
-                    else:
-                        # pass  # return(Constraint.Skip)
-                        lhs = self.dsm_up_level[g, t]
-                        rhs = m.timeincrement[t] * self.dsm_up[g, t]
-                        block.dr_storage_inc.add((g, t), (lhs == rhs))
-
-        self.dr_storage_inc = Constraint(group, m.TIMESTEPS,
-                                         noruleinit=True)
-        self.dr_storage_inc_build = BuildAction(
-            rule=dr_storage_inc_rule)
-
         # # Own addition: Storage roundtrip
         # def dr_storage_roundtrip_inc_rule(block):
         #     """
@@ -598,10 +725,10 @@ class SinkDRBlock(SimpleBlock):
         #     """
         #     for g in group:
         #         # first storage level
-        #         lhs = self.dsm_up_level[g, m.TIMESTEPS[1]]
+        #         lhs = self.dsm_up_level[g, t_first]
         #
         #         # last storage level
-        #         rhs = self.dsm_up_level[g, m.TIMESTEPS[-1]]
+        #         rhs = self.dsm_up_level[g, t_last]
         #
         #         # add constraint
         #         block.dr_storage_roundtrip_inc.add(g, (lhs == rhs))
@@ -615,14 +742,13 @@ class SinkDRBlock(SimpleBlock):
             """
             Fictious demand response storage level for load reduction limit
             """
+            for g in active_group:
+                # maximum (time-dependent) available shifting capacity
+                rhs = g._limit_red
 
-            for t in m.TIMESTEPS:
-                for g in group:
+                for t in timesteps:
                     # fictious demand response load reduction storage level
-                    lhs = self.dsm_do_level[g, t]
-
-                    # maximum (time-dependent) available shifting capacity
-                    rhs = g.capacity_down_mean * g.shift_time
+                    lhs = dsm_do_level[g, t]
 
                     # add constraint
                     block.dr_storage_limit_red.add((g, t), (lhs <= rhs))
@@ -637,14 +763,13 @@ class SinkDRBlock(SimpleBlock):
             """
             Fictious demand response storage level for load increase limit
             """
+            for g in active_group:
+                # maximum (time-dependent) available shifting capacity
+                rhs = g._limit_inc
 
-            for t in m.TIMESTEPS:
-                for g in group:
+                for t in timesteps:
                     # fictious demand response load reduction storage level
-                    lhs = self.dsm_up_level[g, t]
-
-                    # maximum (time-dependent) available shifting capacity
-                    rhs = g.capacity_up_mean * g.shift_time
+                    lhs = dsm_up_level[g, t]
 
                     # add constraint
                     block.dr_storage_limit_inc.add((g, t), (lhs <= rhs))
@@ -663,11 +788,10 @@ class SinkDRBlock(SimpleBlock):
             parameter here in order to achieve an approach comparable
             to the others.
             """
-            for g in group:
+            for g in active_group:
 
                 # sum of all load redutions
-                lhs = sum(self.dsm_do_shed[g, t]
-                          for t in m.TIMESTEPS)
+                lhs = quicksum(shed_vars[g])
 
                 # year limit
                 rhs = g.capacity_down_mean * g.shed_time \
@@ -682,128 +806,196 @@ class SinkDRBlock(SimpleBlock):
 
         # ************* Optional Constraints *****************************
 
+        # units for which the year resp. day limits are active
+        groups_year = tuple(g for g in active_group if g.ActivateYearLimit)
+        groups_day = tuple(g for g in active_group if g.ActivateDayLimit)
+
         # Equation 4.17
         def dr_yearly_limit_red_rule(block):
-            """ 
+            """
             Introduce overall annual (energy) limit for load reductions resp.
             overall limit for optimization timeframe considered
             """
-            for g in group:
-
-                if g.ActivateYearLimit:
-                    # sum of all load redutions
-                    lhs = sum(self.dsm_do_shift[g, t]
-                              for t in m.TIMESTEPS)
+            for g in groups_year:
+                # sum of all load redutions
+                lhs = dsm_do_shift_total[g]
+                rhs = quicksum(do_shift_vars[g])
 
-                    # year limit
-                    rhs = g.capacity_down_mean * g.shift_time \
-                          * g.n_yearLimit_shift
+                # add constraint
+                block.dr_yearly_total_red.add(g, (lhs == rhs))
 
-                    # add constraint
-                    block.dr_yearly_limit_red.add(g, (lhs <= rhs))
+                # year limit
+                rhs = g._limit_red * g.n_yearLimit_shift
 
-                else:
-                    pass  # return(Constraint.Skip)
+                # add constraint
+                block.dr_yearly_limit_red.add(g, (lhs <= rhs))
 
+        self.dr_yearly_total_red = Constraint(group, noruleinit=True)
         self.dr_yearly_limit_red = Constraint(group, noruleinit=True)
         self.dr_yearly_limit_red_build = BuildAction(
             rule=dr_yearly_limit_red_rule)
 
         # Equation 4.18
         def dr_yearly_limit_inc_rule(block):
-            """ 
+            """
             Introduce overall annual (energy) limit for load increases resp.
             overall limit for optimization timeframe considered
             """
-            for g in group:
+            for g in groups_year:
+                # sum of all load increases
+                lhs = dsm_up_total[g]
+                rhs = quicksum(up_vars[g])
 
-                if g.ActivateYearLimit:
-                    # sum of all load increases
-                    lhs = sum(self.dsm_up[g, t]
-                              for t in m.TIMESTEPS)
-
-                    # year limit
-                    rhs = g.capacity_up_mean * g.shift_time \
-                          * g.n_yearLimit_shift
+                # add constraint
+                block.dr_yearly_total_inc.add(g, (lhs == rhs))
 
-                    # add constraint
-                    block.dr_yearly_limit_inc.add(g, (lhs <= rhs))
+                # year limit
+                rhs = g._limit_inc * g.n_yearLimit_shift
 
-                else:
-                    pass  # return(Constraint.Skip)
+                # add constraint
+                block.dr_yearly_limit_inc.add(g, (lhs <= rhs))
 
+        self.dr_yearly_total_inc = Constraint(group, noruleinit=True)
         self.dr_yearly_limit_inc = Constraint(group, noruleinit=True)
         self.dr_yearly_limit_inc_build = BuildAction(
             rule=dr_yearly_limit_inc_rule)
 
+        # Own addition: rolling sum used for equation 4.19
+        def dr_daily_window_red_rule(block):
+            """
+            Rolling sum of load reductions over the last t_dayLimit timesteps
+            """
+            for g in groups_day:
+                t_dayLimit = g.t_dayLimit
+                start = max(t_dayLimit, 1)
+                do_shift = do_shift_vars[g]
+                do_window = do_window_vars[g]
+
+                # initial rolling sum
+                t = t_first
+                lhs = do_window[t]
+                rhs = do_shift[t] if t_dayLimit > 0 else 0
+
+                block.dr_daily_window_red.add((g, t), (lhs == rhs))
+
+                # window still filling up: rolling sum minus previous
+                # rolling sum minus newest load reduction
+                for t in timesteps[1:start]:
+                    lhs = LinearExpression(
+                        constant=0.0, linear_coefs=[1.0, -1.0, -1.0],
+                        linear_vars=[do_window[t], do_window[t - 1], do_shift[t]])
+
+                    block.dr_daily_window_red.add((g, t), (0.0, lhs, 0.0))
+
+                # full window: additionally plus oldest load reduction
+                # dropping out of the window
+                for t in timesteps[start:]:
+                    lhs = LinearExpression(
+                        constant=0.0, linear_coefs=[1.0, -1.0, -1.0, 1.0],
+                        linear_vars=[do_window[t], do_window[t - 1], do_shift[t],
+                                     do_shift[t - t_dayLimit]])
+
+                    block.dr_daily_window_red.add((g, t), (0.0, lhs, 0.0))
+
+        self.dr_daily_window_red = Constraint(group, m.TIMESTEPS,
+                                              noruleinit=True)
+        self.dr_daily_window_red_build = BuildAction(
+            rule=dr_daily_window_red_rule)
+
         # Equation 4.19
         def dr_daily_limit_red_rule(block):
-            """ 
+            """
             Introduce rolling (energy) limit for load reductions
             This effectively limits DR utalization dependent on
             activations within previous hours.
             """
-            for t in m.TIMESTEPS:
-                for g in group:
-
-                    if g.ActivateDayLimit:
-
-                        # main use case
-                        if t >= g.t_dayLimit:
-
-                            # load reduction
-                            lhs = self.dsm_do_shift[g, t]
-
-                            # daily limit
-                            rhs = g.capacity_down_mean * g.shift_time \
-                                  - sum(self.dsm_do_shift[g, t - t_dash]
-                                        for t_dash in range(g.t_dayLimit))
-
-                            # add constraint
-                            block.dr_daily_limit_red.add((g, t), (lhs <= rhs))
+            for g in groups_day:
+                # daily limit (energy)
+                rhs = g._limit_red
+                do_shift = do_shift_vars[g]
+                do_window = do_window_vars[g]
+
+                # main use case
+                for t in timesteps[g.t_dayLimit:]:
+                    # load reduction plus load reductions within the last
+                    # t_dayLimit timesteps
+                    lhs = LinearExpression(
+                        constant=0.0, linear_coefs=[1.0, 1.0],
+                        linear_vars=[do_shift[t], do_window[t]])
 
-                        else:
-                            pass  # return(Constraint.Skip)
-
-                    else:
-                        pass  # return(Constraint.Skip)
+                    # add constraint
+                    block.dr_daily_limit_red.add((g, t), (None, lhs, rhs))
 
         self.dr_daily_limit_red = Constraint(group, m.TIMESTEPS,
                                              noruleinit=True)
         self.dr_daily_limit_red_build = BuildAction(
             rule=dr_daily_limit_red_rule)
 
+        # Own addition: rolling sum used for equation 4.20
+        def dr_daily_window_inc_rule(block):
+            """
+            Rolling sum of load increases over the last t_dayLimit timesteps
+            """
+            for g in groups_day:
+                t_dayLimit = g.t_dayLimit
+                start = max(t_dayLimit, 1)
+                up = up_vars[g]
+                up_window = up_window_vars[g]
+
+                # initial rolling sum
+                t = t_first
+                lhs = up_window[t]
+                rhs = up[t] if t_dayLimit > 0 else 0
+
+                block.dr_daily_window_inc.add((g, t), (lhs == rhs))
+
+                # window still filling up: rolling sum minus previous
+                # rolling sum minus newest load increase
+                for t in timesteps[1:start]:
+                    lhs = LinearExpression(
+                        constant=0.0, linear_coefs=[1.0, -1.0, -1.0],
+                        linear_vars=[up_window[t], up_window[t - 1], up[t]])
+
+                    block.dr_daily_window_inc.add((g, t), (0.0, lhs, 0.0))
+
+                # full window: additionally plus oldest load increase
+                # dropping out of the window
+                for t in timesteps[start:]:
+                    lhs = LinearExpression(
+                        constant=0.0, linear_coefs=[1.0, -1.0, -1.0, 1.0],
+                        linear_vars=[up_window[t], up_window[t - 1], up[t],
+                                     up[t - t_dayLimit]])
+
+                    block.dr_daily_window_inc.add((g, t), (0.0, lhs, 0.0))
+
+        self.dr_daily_window_inc = Constraint(group, m.TIMESTEPS,
+                                              noruleinit=True)
+        self.dr_daily_window_inc_build = BuildAction(
+            rule=dr_daily_window_inc_rule)
+
         # Equation 4.20
         def dr_daily_limit_inc_rule(block):
-            """ 
+            """
             Introduce rolling (energy) limit for load increases
             This effectively limits DR utalization dependent on
             activations within previous hours.
             """
-            for t in m.TIMESTEPS:
-                for g in group:
-
-                    if g.ActivateDayLimit:
-
-                        # main use case
-                        if t >= g.t_dayLimit:
+            for g in groups_day:
+                # daily limit (energy)
+                rhs = g._limit_inc
+                up = up_vars[g]
+                up_window = up_window_vars[g]
+
+                # main use case
+                for t in timesteps[g.t_dayLimit:]:
+                    # load increase plus load increases within the last
+                    # t_dayLimit timesteps
+                    lhs = LinearExpression(
+                        constant=0.0, linear_coefs=[1.0, 1.0],
+                        linear_vars=[up[t], up_window[t]])
 
-                            # load increase
-                            lhs = self.dsm_up[g, t]
-
-                            # daily limit
-                            rhs = g.capacity_up_mean * g.shift_time \
-                                  - sum(self.dsm_up[g, t - t_dash]
-                                        for t_dash in range(g.t_dayLimit))
-
-                            # add constraint
-                            block.dr_daily_limit_inc.add((g, t), (lhs <= rhs))
-
-                        else:
-                            pass  # return(Constraint.Skip)
-
-                    else:
-                        pass  # return(Constraint.Skip)
+                    # add constraint
+                    block.dr_daily_limit_inc.add((g, t), (None, lhs, rhs))
 
         self.dr_daily_limit_inc = Constraint(group, m.TIMESTEPS,
                                              noruleinit=True)
@@ -811,36 +1003,48 @@ class SinkDRBlock(SimpleBlock):
             rule=dr_daily_limit_inc_rule)
 
         # Own addition (optional)
-        def dr_logical_constraint_rule(block):
+        groups_add = tuple(g for g in active_group if g.addition)
+
+        def dr_logical_constraint_exprs():
             """
             Similar to equation 10 from Zerrahn and Schill (2015):
             The sum of upwards and downwards shifts may not be greater than the
             (bigger) capacity limit.
+            Returns the constraint expressions keyed by (g, t).
             """
-            for t in m.TIMESTEPS:
-                for g in group:
-
-                    if g.addition:
+            exprs = {}
+
+            for g in groups_add:
+                capacity_max = capacity_max_arrs[g].tolist()
+                up = up_vars[g]
+                do_shift = do_shift_vars[g]
+                bal_do = bal_do_vars[g]
+                bal_up = bal_up_vars[g]
+                shed = shed_vars[g]
+
+                # without any capacity, all variables are fixed to zero
+                # by the availability constraints already
+                for t in np.flatnonzero(capacity_max_arrs[g]).tolist():
+                    # sum of load increases and reductions
+                    lhs = LinearExpression(
+                        constant=0.0, linear_coefs=[1.0, 1.0, 1.0, 1.0, 1.0],
+                        linear_vars=[up[t], bal_do[t], do_shift[t],
+                                     bal_up[t], shed[t]])
 
-                        # sum of load increases and reductions
-                        lhs = self.dsm_up[g, t] + self.balance_dsm_do[g, t] \
-                              + self.dsm_do_shift[g, t] + self.balance_dsm_up[g, t] \
-                              + self.dsm_do_shed[g, t]
-
-                        # maximum capacity eligibly for load shifting
-                        rhs = max(g.capacity_down[t],
-                                  g.capacity_up[t])
+                    # upper bound
+                    rhs = capacity_max[t]
 
-                        # add constraint
-                        block.dr_logical_constraint.add((g, t), (lhs <= rhs))
+                    # add constraint
+                    exprs[g, t] = (None, lhs, rhs)
 
-                    else:
-                        pass  # return(Constraint.Skip)
+            return exprs
 
-        self.dr_logical_constraint = Constraint(group, m.TIMESTEPS,
-                                                noruleinit=True)
-        self.dr_logical_constraint_build = BuildAction(
-            rule=dr_logical_constraint_rule)
+        # The constraint is only indexed by the (g, t) pairs actually used
+        # and initialised from the prebuilt expressions in one go
+        logical_exprs = dr_logical_constraint_exprs()
+        self.dr_logical_constraint = Constraint(
+            list(logical_exprs),
+            rule=lambda block, g, t: logical_exprs[g, t])
 
     # Equation 4.23
     def _objective_expression(self):
@@ -849,22 +1053,58 @@ class SinkDRBlock(SimpleBlock):
         """
         m = self.parent_block()
 
-        dr_cost = 0
+        timesteps = list(m.TIMESTEPS)
+        n_timesteps = len(timesteps)
+        dr_units = list(self.DR)
+        dsm_up = self.dsm_up
+        dsm_do_shift = self.dsm_do_shift
+        dsm_do_shed = self.dsm_do_shed
+        balance_dsm_up = self.balance_dsm_up
+        balance_dsm_do = self.balance_dsm_do
+        linear_vars = []
+        linear_coefs = []
 
         # Costs may also occur from balancing if they are split onto
         # upwards and downwards shifts ...
-        for t in m.TIMESTEPS:
-            for g in self.DR:
-                dr_cost += (self.dsm_up[g, t]
-                            + self.balance_dsm_do[g, t]) * g.cost_dsm_up
-                dr_cost += (self.dsm_do_shift[g, t]
-                            + self.balance_dsm_up[g, t]) * g.cost_dsm_down_shift \
-                           + self.dsm_do_shed[g, t] * g.cost_dsm_down_shed
+        for g in dr_units:
+            for var, cost in ((dsm_up, g.cost_dsm_up),
+                              (balance_dsm_do, g.cost_dsm_up),
+                              (dsm_do_shift, g.cost_dsm_down_shift),
+                              (balance_dsm_up, g.cost_dsm_down_shift),
+                              (dsm_do_shed, g.cost_dsm_down_shed)):
+                # terms without costs do not contribute to the objective
+                if cost:
+                    linear_vars.extend(var[g, t] for t in timesteps)
+                    linear_coefs.extend([float(cost)] * n_timesteps)
+
+        dr_cost = LinearExpression(constant=0.0, linear_coefs=linear_coefs,
+                                   linear_vars=linear_vars)
 
         self.cost = Expression(expr=dr_cost)
 
         return self.cost
 
+    def extract_arrays(self):
+        """ Return the optimized DR variable values per unit as numpy arrays
+        (one array per variable, indexed by timestep) after solving
+        """
+        m = self.parent_block()
+
+        timesteps = list(m.TIMESTEPS)
+        n_timesteps = len(timesteps)
+        variables = {'dsm_up': self.dsm_up,
+                     'dsm_do_shift': self.dsm_do_shift,
+                     'dsm_do_shed': self.dsm_do_shed,
+                     'balance_dsm_up': self.balance_dsm_up,
+                     'balance_dsm_do': self.balance_dsm_do,
+                     'dsm_up_level': self.dsm_up_level,
+                     'dsm_do_level': self.dsm_do_level}
+
+        return {g: {name: np.fromiter((var[g, t].value for t in timesteps),
+                                      dtype=np.float64, count=n_timesteps)
+                    for name, var in variables.items()}
+                for g in self.DR}
+
 
 # TODO: Add Investment possibility here
 class SinkDRInvestmentBlock(SinkDRBlock):
@@ -879,11 +1119,9 @@ class SinkDRInvestmentBlock(SinkDRBlock):
         if group is None:
             return None
 
-        m = self.parent_block()
-
         # for all DR components get inflow from bus_elec
         for n in group:
-            n.inflow = list(n.inputs)[0]
+            n.inflow = next(iter(n.inputs))
 
         #  ************* SETS *********************************
 
@@ -892,13 +1130,17 @@ class SinkDRInvestmentBlock(SinkDRBlock):
         #  ************* VARIABLES *****************************
 
         # Define bounds for investments in demand response
+        # (time-independent, so they are looked up once per unit)
+        invest_bounds = {g: (g.investment.minimum, g.investment.maximum)
+                         for g in group}
+
         def _dr_investvar_bound_rule(block, g):
             """Rule definition to bound the invested demand response capacity `invest`.
             """
-            return g.investment.minimum, g.investment.maximum
+            return invest_bounds[g]
 
-        # Investment in DR capacity
-        self.invest = Var(self.INVESTDR, m.TIMESTEPS, initialize=0,
+        # Investment in DR capacity (one value per unit, not per timestep)
+        self.invest = Var(self.INVESTDR, initialize=0,
                           within=NonNegativeReals,
                           bounds=_dr_investvar_bound_rule)
 
@@ -915,14 +1157,13 @@ class SinkDRInvestmentBlock(SinkDRBlock):
         if not hasattr(self, 'INVESTDR'):
             return 0
 
-        investment_costs = 0
-
         for n in self.INVESTDR:
-            if n.investment.ep_costs is not None:
-                investment_costs += self.invest[n] * n.investment.ep_costs
-            else:
+            if n.investment.ep_costs is None:
                 raise ValueError("Missing value for investment costs!")
 
+        investment_costs = quicksum(self.invest[n] * n.investment.ep_costs
+                                    for n in self.INVESTDR)
+
         self.investment_costs = Expression(expr=investment_costs)
 
         return investment_costs
\ No newline at end of file
@@ -23,20 +23,24 @@ are matched.
 
 A special thank you goes to Julian Endres and the oemof developping team at RLI.
 """
-import itertools
-
-from numpy import mean
+import numpy as np
 
 from collections import abc
 from pyomo.core.base.block import SimpleBlock
 from pyomo.environ import (Set, NonNegativeReals, Var, Constraint,
-                           BuildAction, Expression)
+                           BuildAction, Expression, quicksum)
+from pyomo.core.expr.numeric_expr import LinearExpression
 
 from oemof.solph.network import Sink
 from oemof.solph.plumbing import sequence
 from oemof.solph import Investment
 
 
+def _mean(arr):
+    """Return the mean of an array as a float, skipping scalars"""
+    return float(arr.mean()) if arr.ndim else float(arr)
+
+
 class SinkDR(Sink):
     r""" A special Sink component which modifies the input demand series used
     to model demand response units for load shifting and shedding.
@@ -113,7 +117,7 @@ class SinkDR(Sink):
         self.demand = sequence(demand)
 
         # Introduce "flexible" delay_times: delay_time is an iterable here
-        self.delay_time = [el for el in range(1, delay_time + 1)]
+        self.delay_time = tuple(range(1, delay_time + 1))
         self.shift_time = shift_time
         self.shed_time = shed_time
         self.cost_dsm_up = cost_dsm_up
@@ -121,9 +125,23 @@ class SinkDR(Sink):
         self.cost_dsm_down_shed = cost_dsm_down_shed
         self.efficiency = efficiency
 
-        # calculate mean values
-        self.capacity_down_mean = mean(capacity_down)
-        self.capacity_up_mean = mean(capacity_up)
+        # raw demand and capacity values as arrays for building the
+        # constraints (scalars are broadcast to the timesteps in the block)
+        self._demand_arr = np.asarray(demand, dtype=np.float64)
+        self._capacity_down_arr = np.asarray(capacity_down, dtype=np.float64)
+        self._capacity_up_arr = np.asarray(capacity_up, dtype=np.float64)
+
+        # calculate mean values (as plain floats; no reduction for scalars)
+        self.capacity_down_mean = _mean(self._capacity_down_arr)
+        self.capacity_up_mean = _mean(self._capacity_up_arr)
+
+        # energy limits for shifting used in the storage, year and day
+        # limits (shift-ineligible units cannot shift any energy)
+        if shift_eligibility:
+            self._limit_red = self.capacity_down_mean * shift_time
+            self._limit_inc = self.capacity_up_mean * shift_time
+        else:
+            self._limit_red = self._limit_inc = 0.0
 
         # Optionally include year resp. day limits for shifted / shedded energy
         # Introduction of these is controlled through boolean control parameters
@@ -235,28 +253,69 @@ class SinkDRBlock(SimpleBlock):
 
         m = self.parent_block()
 
+        # materialize the group once; it is iterated by every rule below
+        group = tuple(group)
+
         # for all DR components get inflow from bus_elec
         for n in group:
-            n.inflow = list(n.inputs)[0]
+            n.inflow = next(iter(n.inputs))
+
+            # day limit window length as an int (only set if active)
+            if n.ActivateDayLimit:
+                n._t_dayLimit = int(n.t_dayLimit)
 
         #  ************* SETS *********************************
 
         # Set of DR Components
-        self.DR = Set(initialize=[n for n in group])
+        self.DR = Set(initialize=group)
 
         # Depict different delay_times per unit:
         # Do a mapping
         # Solution is based on this stack overflow issue:
         # https://stackoverflow.com/questions/59237082/variable-indexed-by-an-indexed-set-with-pyomo
         # accessed 13.08.2020
-        map_DR_H = {k: v for k, v in zip([n for n in group],
-                                         [n.delay_time for n in group])}
-
-        unique_H = set(itertools.chain.from_iterable(map_DR_H.values()))
+        unique_H = sorted(set().union(*(n.delay_time for n in group)))
         self.H = Set(initialize=unique_H)
 
         self.DR_H = Set(within=self.DR * self.H,
-                        initialize=[(dr, h) for dr in map_DR_H for h in map_DR_H[dr]])
+                        initialize=[(n, h) for n in group for h in n.delay_time])
+
+        timesteps = tuple(m.TIMESTEPS)
+        t_first = timesteps[0]
+        # time increments as plain floats (no Param lookups in the rules)
+        dt = [float(m.timeincrement[t]) for t in timesteps]
+
+        # Sparse index of the capacity balances: only shift-eligible units
+        # and timesteps t >= h for which a shift at t - h can be balanced
+        self.DR_H_BALANCE = Set(
+            dimen=3,
+            initialize=[(g, h, t) for g in group if g.shift_eligibility
+                        for h in g.delay_time for t in timesteps[h:]])
+
+        def _timestep_array(arr):
+            """Return a unit parameter as an array with one value per timestep"""
+            if arr.ndim == 0:
+                return np.full(len(timesteps), float(arr))
+            return arr[:len(timesteps)]
+
+        # Per-unit parameter arrays with exactly one entry per timestep
+        # (timesteps run from 0 to T-1, so t doubles as position)
+        demand_arrs = {g: _timestep_array(g._demand_arr) for g in group}
+        capacity_down_arrs = {g: _timestep_array(g._capacity_down_arr)
+                              for g in group}
+        capacity_up_arrs = {g: _timestep_array(g._capacity_up_arr)
+                            for g in group}
+        # maximum capacity eligibly for load shifting (logical constraint)
+        capacity_max_arrs = {g: np.maximum(capacity_down_arrs[g],
+                                           capacity_up_arrs[g])
+                             for g in group if g.addition}
+
+        # plain float values for the constraint right hand sides
+        demand = {g: arr.tolist() for g, arr in demand_arrs.items()}
+        capacity_down = {g: arr.tolist()
+                         for g, arr in capacity_down_arrs.items()}
+        capacity_up = {g: arr.tolist() for g, arr in capacity_up_arrs.items()}
+        capacity_max = {g: arr.tolist() for g, arr in capacity_max_arrs.items()}
 
         #  ************* VARIABLES *****************************
 
@@ -292,47 +351,98 @@ class SinkDRBlock(SimpleBlock):
 
         # Variable fictious DR storage level for downwards load shifts (energy)
         # Corresponds to W_levelRed in the original terminology
+        # Bounded by the maximum available shifting energy (Equation 4.15)
+        def _dr_storage_limit_red_bounds(block, g, t):
+            return 0, g._limit_red
+
         # self.dsm_do_level = Var(self.DR, m.TIMESTEPS, initialize=0,
         self.dsm_do_level = Var(self.DR, m.TIMESTEPS, initialize=0,
-                                within=NonNegativeReals)
+                                within=NonNegativeReals,
+                                bounds=_dr_storage_limit_red_bounds)
 
         # Variable fictious DR storage level for upwards load shifts (energy)
         # Corresponds to W_levelInc in the original terminology
+        # Bounded by the maximum available shifting energy (Equation 4.16)
+        def _dr_storage_limit_inc_bounds(block, g, t):
+            return 0, g._limit_inc
+
         # self.dsm_up_level = Var(self.DR, m.TIMESTEPS, initialize=0,
         self.dsm_up_level = Var(self.DR, m.TIMESTEPS, initialize=0,
-                                within=NonNegativeReals)
+                                within=NonNegativeReals,
+                                bounds=_dr_storage_limit_inc_bounds)
+
+        # Per-(g, t) lists of the shifting variables over all delay times
+        # of a unit; built once so that the expressions and constraints
+        # below do not look up every (g, h, t) key again
+        def _delay_time_lists(var):
+            return {(g, t): [var[g, h, t] for h in g.delay_time]
+                    for g in group for t in timesteps}
+
+        do_shift_lists = _delay_time_lists(self.dsm_do_shift)
+        up_lists = _delay_time_lists(self.dsm_up)
+        bal_do_lists = _delay_time_lists(self.balance_dsm_do)
+        bal_up_lists = _delay_time_lists(self.balance_dsm_up)
+
+        #  ************* EXPRESSIONS *****************************
+
+        # Sums of the shifting variables over all delay times of a unit;
+        # built once per (g, t) and referenced by the constraints below
+        self.total_do_shift = Expression(
+            self.DR, m.TIMESTEPS,
+            rule=lambda block, g, t: quicksum(do_shift_lists[g, t]))
+        self.total_up = Expression(
+            self.DR, m.TIMESTEPS,
+            rule=lambda block, g, t: quicksum(up_lists[g, t]))
+        self.total_bal_do = Expression(
+            self.DR, m.TIMESTEPS,
+            rule=lambda block, g, t: quicksum(bal_do_lists[g, t]))
+        self.total_bal_up = Expression(
+            self.DR, m.TIMESTEPS,
+            rule=lambda block, g, t: quicksum(bal_up_lists[g, t]))
+
+        # local aliases of the variable and expression components
+        dsm_do_shift = self.dsm_do_shift
+        dsm_do_shed = self.dsm_do_shed
+        dsm_up = self.dsm_up
+        balance_dsm_do = self.balance_dsm_do
+        balance_dsm_up = self.balance_dsm_up
+        dsm_do_level = self.dsm_do_level
+        dsm_up_level = self.dsm_up_level
+        total_do_shift = self.total_do_shift
+        total_up = self.total_up
+        total_bal_do = self.total_bal_do
+        total_bal_up = self.total_bal_up
 
         #  ************* CONSTRAINTS *****************************
 
-        def _shift_shed_vars_rule(block):
-            """
-            Force shifting resp. shedding variables to zero dependent
-            on how boolean parameters for shift resp. shed eligibility
-            are set.
-            """
-            for t in m.TIMESTEPS:
-                for g in group:
-                    for h in g.delay_time:
-
-                        if not g.shift_eligibility:
-                            # Memo: By forcing dsm_do_shift for shifting to zero, dsm up should
-                            # implicitly be forced to zero as well, since otherwhise,
-                            # constraints below would not hold ...
-                            lhs = self.dsm_do_shift[g, h, t]
-                            rhs = 0
-
-                            block.shift_shed_vars.add((g, h, t), (lhs == rhs))
-
-                        if not g.shed_eligibility:
-                            lhs = self.dsm_do_shed[g, t]
-                            rhs = 0
+        # Fix shifting resp. shedding variables to zero dependent
+        # on how boolean parameters for shift resp. shed eligibility
+        # are set. Fixed variables drop out of the LP entirely, so no
+        # constraints are needed (and none are built if all units are
+        # eligible for both).
+        for g in group:
+
+            if not g.shift_eligibility:
+                for h in g.delay_time:
+                    for t in timesteps:
+                        # Memo: dsm_up would otherwise only implicitly be
+                        # forced to zero through the constraints below
+                        dsm_do_shift[g, h, t].fix(0)
+                        dsm_up[g, h, t].fix(0)
+                        # if only shedding is possible, balancing variables
+                        # can be forced to 0 as well
+                        balance_dsm_do[g, h, t].fix(0)
+                        balance_dsm_up[g, h, t].fix(0)
 
-                            block.shift_shed_vars.add((g, h, t), (lhs == rhs))
+            else:
+                # no balancing for the first timestep
+                for h in g.delay_time:
+                    balance_dsm_do[g, h, t_first].fix(0)
+                    balance_dsm_up[g, h, t_first].fix(0)
 
-        self.shift_shed_vars = Constraint(group, self.H, m.TIMESTEPS,
-                                          noruleinit=True)
-        self.shift_shed_vars_build = BuildAction(
-            rule=_shift_shed_vars_rule)
+            if not g.shed_eligibility:
+                for t in timesteps:
+                    dsm_do_shed[g, t].fix(0)
 
         # Relation between inflow and effective Sink consumption
         def _input_output_relation_rule(block):
@@ -341,6 +451,7 @@ class SinkDRBlock(SimpleBlock):
             The actual demand after DR.
             Bus outflow == Demand +- DR (i.e. effective Sink consumption)
             """
+            add = block.input_output_relation.add
 
             for t in m.TIMESTEPS:
 
@@ -350,210 +461,122 @@ class SinkDRBlock(SimpleBlock):
                     lhs = m.flow[g.inflow, g, t]
 
                     # Demand +- DR
-                    rhs = g.demand[t] + sum(self.dsm_up[g, h, t]
-                                            + self.balance_dsm_do[g, h, t]
-                                            - self.dsm_do_shift[g, h, t]
-                                            - self.balance_dsm_up[g, h, t]
-                                            for h in g.delay_time) \
-                          - self.dsm_do_shed[g, t]
+                    rhs = demand[g][t] + total_up[g, t] \
+                          + total_bal_do[g, t] \
+                          - total_do_shift[g, t] \
+                          - total_bal_up[g, t] \
+                          - dsm_do_shed[g, t]
 
                     # add constraint
-                    block.input_output_relation.add((g, t), (lhs == rhs))
+                    add((g, t), (lhs == rhs))
 
         self.input_output_relation = Constraint(group, m.TIMESTEPS,
                                                 noruleinit=True)
         self.input_output_relation_build = BuildAction(
             rule=_input_output_relation_rule)
 
-        # Equation 4.8
-        def capacity_balance_red_rule(block):
-            """
-            Load reduction must be balanced by load increase within delay_time
-            """
-            for t in m.TIMESTEPS:
-                for g in group:
-                    for h in g.delay_time:
-
-                        if g.shift_eligibility:
-
-                            # main use case
-                            if t >= h:
-                                # balance load reduction
-                                lhs = self.balance_dsm_do[g, h, t]
-
-                                # load reduction (efficiency considered)
-                                rhs = self.dsm_do_shift[g, h, t - h] / g.efficiency
-
-                                # add constraint
-                                block.capacity_balance_red.add((g, h, t), (lhs == rhs))
-
-                            # no balancing for the first timestep
-                            elif t == m.TIMESTEPS[1]:
-                                lhs = self.balance_dsm_do[g, h, t]
-                                rhs = 0
-
-                                block.capacity_balance_red.add((g, h, t), (lhs == rhs))
-
-                            else:
-                                pass  # return(Constraint.Skip)
-
-                        # if only shedding is possible, balancing variable can be forced to 0
-                        else:
-                            lhs = self.balance_dsm_do[g, h, t]
-                            rhs = 0
-
-                            block.capacity_balance_red.add((g, h, t), (lhs == rhs))
-
-        self.capacity_balance_red = Constraint(group, self.H, m.TIMESTEPS,
-                                               noruleinit=True)
-        self.capacity_balance_red_build = BuildAction(
-            rule=capacity_balance_red_rule)
-
-        # Equation 4.9
-        def capacity_balance_inc_rule(block):
-            """
-            Load increased must be balanced by load reduction within delay_time
-            """
-            for t in m.TIMESTEPS:
-                for g in group:
-                    for h in g.delay_time:
-
-                        if g.shift_eligibility:
-
-                            # main use case
-                            if t >= h:
-                                # balance load increase
-                                lhs = self.balance_dsm_up[g, h, t]
-
-                                # load increase (efficiency considered)
-                                rhs = self.dsm_up[g, h, t - h] * g.efficiency
-
-                                # add constraint
-                                block.capacity_balance_inc.add((g, h, t), (lhs == rhs))
-
-                            # no balancing for the first timestep
-                            elif t == m.TIMESTEPS[1]:
-                                lhs = self.balance_dsm_up[g, h, t]
-                                rhs = 0
-
-                                block.capacity_balance_inc.add((g, h, t), (lhs == rhs))
-
-                            else:
-                                pass  # return(Constraint.Skip)
-
-                        # if only shedding is possible, balancing variable can be forced to 0
-                        else:
-                            lhs = self.balance_dsm_up[g, h, t]
-                            rhs = 0
-
-                            block.capacity_balance_inc.add((g, h, t), (lhs == rhs))
-
-        self.capacity_balance_inc = Constraint(group, self.H, m.TIMESTEPS,
-                                               noruleinit=True)
-        self.capacity_balance_inc_build = BuildAction(
-            rule=capacity_balance_inc_rule)
-
-        # Own addition: prevent shifts which cannot be compensated
-        def no_comp_red_rule(block):
+        # Equations 4.8 and 4.9
+        def _capacity_balance_rule(balance, shift, divide):
             """
-            Prevent downwards shifts that cannot be balanced anymore
-            within the optimization timeframe
+            Load reduction resp. increase must be balanced by load
+            increase resp. reduction within delay_time
             """
-            for t in m.TIMESTEPS:
-                for g in group:
+            def rule(block, g, h, t):
+                # balance load reduction resp. increase
+                lhs = balance[g, h, t]
 
-                    if g.fixes:
-                        for h in g.delay_time:
+                # load reduction resp. increase (efficiency considered)
+                if divide:
+                    rhs = shift[g, h, t - h] / g.efficiency
+                else:
+                    rhs = shift[g, h, t - h] * g.efficiency
 
-                            if t > m.TIMESTEPS[-1] - h:
-                                # no load reduction anymore (dsm_do_shift = 0)
-                                lhs = self.dsm_do_shift[g, h, t]
-                                rhs = 0
-                                block.no_comp_red.add((g, h, t), (lhs == rhs))
+                return lhs == rhs
 
-                    else:
-                        pass  # return(Constraint.Skip)
+            return rule
 
-        self.no_comp_red = Constraint(group, self.H, m.TIMESTEPS,
-                                      noruleinit=True)
-        self.no_comp_red_build = BuildAction(
-            rule=no_comp_red_rule)
+        self.capacity_balance_red = Constraint(
+            self.DR_H_BALANCE,
+            rule=_capacity_balance_rule(balance_dsm_do,
+                                        dsm_do_shift, divide=True))
+        self.capacity_balance_inc = Constraint(
+            self.DR_H_BALANCE,
+            rule=_capacity_balance_rule(balance_dsm_up,
+                                        dsm_up, divide=False))
 
         # Own addition: prevent shifts which cannot be compensated
-        def no_comp_inc_rule(block):
-            """
-            Prevent upwards shifts that cannot be balanced anymore
-            within the optimization timeframe
-            """
-            for t in m.TIMESTEPS:
-                for g in group:
-
-                    if  g.fixes:
-                        for h in g.delay_time:
-
-                            if t > m.TIMESTEPS[-1] - h:
-                                # no load increase anymore (dsm_up = 0)
-                                lhs = self.dsm_up[g, h, t]
-                                rhs = 0
-                                block.no_comp_inc.add((g, h, t), (lhs == rhs))
+        # within the optimization timeframe; no load reductions resp.
+        # increases within the last h timesteps (fixed rather than
+        # constrained to 0)
+        for g in group:
 
-                    else:
-                        pass  # return(Constraint.Skip)
+            if not g.fixes:
+                continue
 
-        self.no_comp_inc = Constraint(group, self.H, m.TIMESTEPS,
-                                      noruleinit=True)
-        self.no_comp_inc_build = BuildAction(
-            rule=no_comp_inc_rule)
+            for h in g.delay_time:
+                for t in timesteps[-h:]:
+                    dsm_do_shift[g, h, t].fix(0)
+                    dsm_up[g, h, t].fix(0)
 
-        # Equation 4.11
-        def availability_red_rule(block):
+        # Equations 4.11 and 4.12
+        def availability_rule(block):
             """
-            Load reduction must be smaller than or equal to the
-            (time-dependent) capacity limit
+            Load reduction resp. load increase must be smaller than or equal
+            to the (time-dependent) capacity limit
             """
+            add_red = block.availability_red.add
+            add_inc = block.availability_inc.add
 
-            for t in m.TIMESTEPS:
-                for g in group:
+            for g in group:
+                delay_time = g.delay_time
+                n_h = len(delay_time)
+
+                # no capacity: fix the variables instead of adding a row
+                for t in np.flatnonzero(capacity_down_arrs[g] == 0).tolist():
+                    for h in delay_time:
+                        dsm_do_shift[g, h, t].fix(0)
+                        balance_dsm_up[g, h, t].fix(0)
+                    dsm_do_shed[g, t].fix(0)
+
+                for t in np.flatnonzero(capacity_up_arrs[g] == 0).tolist():
+                    for h in delay_time:
+                        dsm_up[g, h, t].fix(0)
+                        balance_dsm_do[g, h, t].fix(0)
+
+                for t in np.flatnonzero(capacity_down_arrs[g]).tolist():
                     # load reduction
-                    lhs = sum(self.dsm_do_shift[g, h, t]
-                              + self.balance_dsm_up[g, h, t]
-                              for h in g.delay_time) \
-                          + self.dsm_do_shed[g, t]
+                    lhs = LinearExpression(
+                        constant=0.0,
+                        linear_coefs=[1.0] * (2 * n_h + 1),
+                        linear_vars=(do_shift_lists[g, t]
+                                     + bal_up_lists[g, t]
+                                     + [dsm_do_shed[g, t]]))
 
                     # upper bound
-                    rhs = g.capacity_down[t]
+                    rhs = capacity_down[g][t]
 
                     # add constraint
-                    block.availability_red.add((g, t), (lhs <= rhs))
+                    add_red((g, t), (None, lhs, rhs))
 
-        self.availability_red = Constraint(group, m.TIMESTEPS,
-                                           noruleinit=True)
-        self.availability_red_build = BuildAction(
-            rule=availability_red_rule)
-
-        # Equation 4.12
-        def availability_inc_rule(block):
-            """
-            Load increase must be smaller than or equal to the
-            (time-dependent) capacity limit
-            """
-            for t in m.TIMESTEPS:
-                for g in group:
+                for t in np.flatnonzero(capacity_up_arrs[g]).tolist():
                     # load increase
-                    lhs = sum(self.dsm_up[g, h, t]
-                              + self.balance_dsm_do[g, h, t]
-                              for h in g.delay_time)
+                    lhs = LinearExpression(
+                        constant=0.0,
+                        linear_coefs=[1.0] * (2 * n_h),
+                        linear_vars=up_lists[g, t] + bal_do_lists[g, t])
 
                     # upper bound
-                    rhs = g.capacity_up[t]
+                    rhs = capacity_up[g][t]
 
                     # add constraint
-                    block.availability_inc.add((g, t), (lhs <= rhs))
+                    add_inc((g, t), (None, lhs, rhs))
 
+        self.availability_red = Constraint(group, m.TIMESTEPS,
+                                           noruleinit=True)
         self.availability_inc = Constraint(group, m.TIMESTEPS,
                                            noruleinit=True)
-        self.availability_inc_build = BuildAction(
-            rule=availability_inc_rule)
+        self.availability_build = BuildAction(
+            rule=availability_rule)
 
         # Equation 4.13
         def dr_storage_red_rule(block):
@@ -561,28 +584,27 @@ class SinkDRBlock(SimpleBlock):
             Fictious demand response storage level for load reductions
             transition equation
             """
-            for t in m.TIMESTEPS:
-                for g in group:
+            add = block.dr_storage_red.add
 
-                    # avoid timesteps prior to t = 0
-                    if t > 0:
-                        # reduction minus balancing of reductions
-                        lhs = m.timeincrement[t] * sum((self.dsm_do_shift[g, h, t]
-                                                        - self.balance_dsm_do[g, h, t]
-                                                        * g.efficiency) for h in g.delay_time)
+            for g in group:
+                efficiency = g.efficiency
 
-                        # load reduction storage level transition
-                        rhs = self.dsm_do_level[g, t] - self.dsm_do_level[g, t - 1]
+                # initial storage level (no storage level prior to t = 0)
+                t = t_first
+                lhs = dsm_do_level[g, t]
+                rhs = dt[0] * total_do_shift[g, t]
+                add((g, t), (lhs == rhs))
 
-                        # add constraint
-                        block.dr_storage_red.add((g, t), (lhs == rhs))
+                for t, t_prev, dt_t in zip(timesteps[1:], timesteps, dt[1:]):
+                    # reduction minus balancing of reductions
+                    lhs = dt_t * (total_do_shift[g, t]
+                                  - total_bal_do[g, t] * efficiency)
 
-                    else:
-                        # pass  # return(Constraint.Skip)
-                        lhs = self.dsm_do_level[g, t]
-                        rhs = m.timeincrement[t] * sum(self.dsm_do_shift[g, h, t]
-                                                       for h in g.delay_time)
-                        block.dr_storage_red.add((g, t), (lhs == rhs))
+                    # load reduction storage level transition
+                    rhs = dsm_do_level[g, t] - dsm_do_level[g, t_prev]
+
+                    # add constraint
+                    add((g, t), (lhs == rhs))
 
         self.dr_storage_red = Constraint(group, m.TIMESTEPS,
                                          noruleinit=True)
@@ -624,29 +646,27 @@ class SinkDRBlock(SimpleBlock):
             Fictious demand response storage level for load increase
             transition equation
             """
-            for t in m.TIMESTEPS:
-                for g in group:
+            add = block.dr_storage_inc.add
+
+            for g in group:
+                efficiency = g.efficiency
 
-                    # avoid timesteps prior to t = 0
-                    if t > 0:
-                        # increases minus balancing of reductions
-                        lhs = m.timeincrement[t] * sum((self.dsm_up[g, h, t]
-                                                        * g.efficiency
-                                                        - self.balance_dsm_up[g, h, t])
-                                                       for h in g.delay_time)
+                # initial storage level (no storage level prior to t = 0)
+                t = t_first
+                lhs = dsm_up_level[g, t]
+                rhs = dt[0] * total_up[g, t]
+                add((g, t), (lhs == rhs))
 
-                        # load increase storage level transition
-                        rhs = self.dsm_up_level[g, t] - self.dsm_up_level[g, t - 1]
+                for t, t_prev, dt_t in zip(timesteps[1:], timesteps, dt[1:]):
+                    # increases minus balancing of reductions
+                    lhs = dt_t * (total_up[g, t] * efficiency
+                                  - total_bal_up[g, t])
 
-                        # add constraint
-                        block.dr_storage_inc.add((g, t), (lhs == rhs))
+                    # load increase storage level transition
+                    rhs = dsm_up_level[g, t] - dsm_up_level[g, t_prev]
 
-                    else:
-                        # pass  # return(Constraint.Skip)
-                        lhs = self.dsm_up_level[g, t]
-                        rhs = m.timeincrement[t] * sum(self.dsm_up[g, h, t]
-                                                       for h in g.delay_time)
-                        block.dr_storage_inc.add((g, t), (lhs == rhs))
+                    # add constraint
+                    add((g, t), (lhs == rhs))
 
         self.dr_storage_inc = Constraint(group, m.TIMESTEPS,
                                          noruleinit=True)
@@ -682,47 +702,8 @@ class SinkDRBlock(SimpleBlock):
         # self.df_storage_roundtrip_inc_build = BuildAction(
         #     rule=dr_storage_roundtrip_inc_rule)
 
-        # Equation 4.15
-        def dr_storage_limit_red_rule(block):
-            """
-            Fictious demand response storage level for load reduction limit
-            """
-            for t in m.TIMESTEPS:
-                for g in group:
-                    # fictious demand response load reduction storage level
-                    lhs = self.dsm_do_level[g, t]
-
-                    # maximum (time-dependent) available shifting capacity
-                    rhs = g.capacity_down_mean * g.shift_time
-
-                    # add constraint
-                    block.dr_storage_limit_red.add((g, t), (lhs <= rhs))
-
-        self.dr_storage_limit_red = Constraint(group, m.TIMESTEPS,
-                                               noruleinit=True)
-        self.dr_storage_level_red_build = BuildAction(
-            rule=dr_storage_limit_red_rule)
-
-        # Equation 4.16
-        def dr_storage_limit_inc_rule(block):
-            """
-            Fictious demand response storage level for load increase limit
-            """
-            for t in m.TIMESTEPS:
-                for g in group:
-                    # fictious demand response load reduction storage level
-                    lhs = self.dsm_up_level[g, t]
-
-                    # maximum (time-dependent) available shifting capacity
-                    rhs = g.capacity_up_mean * g.shift_time
-
-                    # add constraint
-                    block.dr_storage_limit_inc.add((g, t), (lhs <= rhs))
-
-        self.dr_storage_limit_inc = Constraint(group, m.TIMESTEPS,
-                                               noruleinit=True)
-        self.dr_storage_level_inc_build = BuildAction(
-            rule=dr_storage_limit_inc_rule)
+        # Equations 4.15 and 4.16 (storage level limits) are set as
+        # bounds of dsm_do_level and dsm_up_level
 
         # Equation 4.17' -> load shedding
         def dr_yearly_limit_shed_rule(block):
@@ -735,15 +716,16 @@ class SinkDRBlock(SimpleBlock):
             """
             for g in group:
                 # sum of all load redutions
-                lhs = sum(self.dsm_do_shed[g, t]
-                          for t in m.TIMESTEPS)
+                lhs = LinearExpression(
+                    constant=0.0, linear_coefs=[1.0] * len(timesteps),
+                    linear_vars=[dsm_do_shed[g, t] for t in timesteps])
 
                 # year limit
                 rhs = g.capacity_down_mean * g.shed_time \
                       * g.n_yearLimit_shed
 
                 # add constraint
-                block.dr_yearly_limit_shed.add(g, (lhs <= rhs))
+                block.dr_yearly_limit_shed.add(g, (None, lhs, rhs))
 
         self.dr_yearly_limit_shed = Constraint(group, noruleinit=True)
         self.dr_yearly_limit_shed_build = BuildAction(
@@ -751,33 +733,37 @@ class SinkDRBlock(SimpleBlock):
 
         # ************* Optional Constraints *****************************
 
+        # units for which the year resp. day limits are active
+        groups_year = tuple(g for g in group if g.ActivateYearLimit)
+        groups_day = tuple(g for g in group if g.ActivateDayLimit)
+
         # Equation 4.17
         def dr_yearly_limit_red_rule(block):
             """
             Introduce overall annual (energy) limit for load reductions resp.
             overall limit for optimization timeframe considered
             """
-            for g in group:
+            for g in groups_year:
+                delay_time = g.delay_time
 
-                if g.ActivateYearLimit:
-                    # sum of all load redutions
-                    lhs = sum(sum(self.dsm_do_shift[g, h, t]
-                                  for h in g.delay_time)
-                              for t in m.TIMESTEPS)
-
-                    # year limit
-                    rhs = g.capacity_down_mean * g.shift_time \
-                          * g.n_yearLimit_shift
+                # sum of all load redutions
+                lhs = LinearExpression(
+                    constant=0.0,
+                    linear_coefs=[1.0] * (len(delay_time) * len(timesteps)),
+                    linear_vars=[dsm_do_shift[g, h, t]
+                                 for h in delay_time for t in timesteps])
 
-                    # add constraint
-                    block.dr_yearly_limit_red.add(g, (lhs <= rhs))
+                # year limit
+                rhs = g._limit_red * g.n_yearLimit_shift
 
-                else:
-                    pass  # return(Constraint.Skip)
+                # add constraint
+                block.dr_yearly_limit_red.add(g, (None, lhs, rhs))
 
-        self.dr_yearly_limit_red = Constraint(group, noruleinit=True)
-        self.dr_yearly_limit_red_build = BuildAction(
-            rule=dr_yearly_limit_red_rule)
+        if groups_year:
+            self.dr_yearly_limit_red = Constraint(groups_year,
+                                                  noruleinit=True)
+            self.dr_yearly_limit_red_build = BuildAction(
+                rule=dr_yearly_limit_red_rule)
 
         # Equation 4.18
         def dr_yearly_limit_inc_rule(block):
@@ -785,148 +771,124 @@ class SinkDRBlock(SimpleBlock):
             Introduce overall annual (energy) limit for load increases resp.
             overall limit for optimization timeframe considered
             """
-            for g in group:
+            for g in groups_year:
+                delay_time = g.delay_time
 
-                if g.ActivateYearLimit:
-                    # sum of all load increases
-                    lhs = sum(sum(self.dsm_up[g, h, t]
-                                  for h in g.delay_time)
-                              for t in m.TIMESTEPS)
+                # sum of all load increases
+                lhs = LinearExpression(
+                    constant=0.0,
+                    linear_coefs=[1.0] * (len(delay_time) * len(timesteps)),
+                    linear_vars=[dsm_up[g, h, t]
+                                 for h in delay_time for t in timesteps])
 
-                    # year limit
-                    rhs = g.capacity_up_mean * g.shift_time \
-                          * g.n_yearLimit_shift
-
-                    # add constraint
-                    block.dr_yearly_limit_inc.add(g, (lhs <= rhs))
-
-                else:
-                    pass  # return(Constraint.Skip)
-
-        self.dr_yearly_limit_inc = Constraint(group, noruleinit=True)
-        self.dr_yearly_limit_inc_build = BuildAction(
-            rule=dr_yearly_limit_inc_rule)
-
-        # Equation 4.19
-        def dr_daily_limit_red_rule(block):
-            """
-            Introduce rolling (energy) limit for load reductions
-            This effectively limits DR utalization dependent on
-            activations within previous hours.
-
-            Note: This effectively limits downshift in the last
-            hour of a time span to the remaining share of an
-            average downshift.
-            """
-            for t in m.TIMESTEPS:
-                for g in group:
-
-                    if g.ActivateDayLimit:
-
-                        # main use case
-                        if t >= g.t_dayLimit:
-
-                            # load reduction
-                            lhs = sum(self.dsm_do_shift[g, h, t]
-                                      for h in g.delay_time)
-
-                            # daily limit
-                            rhs = g.capacity_down_mean * g.shift_time \
-                                  - sum(sum(self.dsm_do_shift[g, h, t - t_dash]
-                                            for h in g.delay_time)
-                                        for t_dash in range(1, int(g.t_dayLimit)+1))
-
-                            # add constraint
-                            block.dr_daily_limit_red.add((g, t), (lhs <= rhs))
-
-                        else:
-                            pass  # return(Constraint.Skip)
+                # year limit
+                rhs = g._limit_inc * g.n_yearLimit_shift
 
-                    else:
-                        pass  # return(Constraint.Skip)
+                # add constraint
+                block.dr_yearly_limit_inc.add(g, (None, lhs, rhs))
 
-        self.dr_daily_limit_red = Constraint(group, m.TIMESTEPS,
-                                             noruleinit=True)
-        self.dr_daily_limit_red_build = BuildAction(
-            rule=dr_daily_limit_red_rule)
+        if groups_year:
+            self.dr_yearly_limit_inc = Constraint(groups_year,
+                                                  noruleinit=True)
+            self.dr_yearly_limit_inc_build = BuildAction(
+                rule=dr_yearly_limit_inc_rule)
 
-        # Equation 4.20
-        def dr_daily_limit_inc_rule(block):
+        # Equations 4.19 and 4.20
+        def _dr_daily_limit_rule(name, shift, limit_attr):
             """
-            Introduce rolling (energy) limit for load increases
+            Introduce rolling (energy) limit for load reductions resp.
+            load increases
             This effectively limits DR utalization dependent on
             activations within previous hours.
 
-            Note: This effectively limits upshift in the last
+            Note: This effectively limits down- resp. upshift in the last
             hour of a time span to the remaining share of an
-            average upshift.
-            """
-            for t in m.TIMESTEPS:
-                for g in group:
-
-                    if g.ActivateDayLimit:
-
-                        # main use case
-                        if t >= g.t_dayLimit:
-
-                            # load increase
-                            lhs = sum(self.dsm_up[g, h, t]
-                                      for h in g.delay_time)
+            average down- resp. upshift.
+            """
+            def rule(block):
+                add = getattr(block, name).add
+
+                for g in groups_day:
+                    delay_time = g.delay_time
+                    n_h = len(delay_time)
+                    t_dayLimit = g._t_dayLimit
+                    window_len = n_h * (t_dayLimit + 1)
+
+                    # daily limit
+                    rhs = getattr(g, limit_attr)
+
+                    # all shifts of the unit ordered by timestep, so the
+                    # rolling window for t is a plain slice
+                    shifts = [shift[g, h, t]
+                              for t in timesteps for h in delay_time]
+
+                    # main use case (no constraint for t < t_dayLimit)
+                    for t in timesteps[t_dayLimit:]:
+                        # shift plus those of the previous
+                        # t_dayLimit timesteps
+                        lhs = LinearExpression(
+                            constant=0.0,
+                            linear_coefs=[1.0] * window_len,
+                            linear_vars=shifts[(t - t_dayLimit) * n_h:
+                                               (t + 1) * n_h])
 
-                            # daily limit
-                            rhs = g.capacity_up_mean * g.shift_time \
-                                  - sum(sum(self.dsm_up[g, h, t - t_dash]
-                                            for h in g.delay_time)
-                                        for t_dash in range(1, int(g.t_dayLimit)+1))
-
-                            # add constraint
-                            block.dr_daily_limit_inc.add((g, t), (lhs <= rhs))
+                        # add constraint
+                        add((g, t), (None, lhs, rhs))
 
-                        else:
-                            pass  # return(Constraint.Skip)
+            return rule
 
-                    else:
-                        pass  # return(Constraint.Skip)
+        if groups_day:
+            self.dr_daily_limit_red = Constraint(groups_day, m.TIMESTEPS,
+                                                 noruleinit=True)
+            self.dr_daily_limit_red_build = BuildAction(
+                rule=_dr_daily_limit_rule('dr_daily_limit_red',
+                                          dsm_do_shift, '_limit_red'))
 
-        self.dr_daily_limit_inc = Constraint(group, m.TIMESTEPS,
-                                             noruleinit=True)
-        self.dr_daily_limit_inc_build = BuildAction(
-            rule=dr_daily_limit_inc_rule)
+            self.dr_daily_limit_inc = Constraint(groups_day, m.TIMESTEPS,
+                                                 noruleinit=True)
+            self.dr_daily_limit_inc_build = BuildAction(
+                rule=_dr_daily_limit_rule('dr_daily_limit_inc',
+                                          dsm_up, '_limit_inc'))
 
         # Own addition (optional)
-        def dr_logical_constraint_rule(block):
+        groups_add = tuple(g for g in group if g.addition)
+
+        def dr_logical_constraint_exprs():
             """
             Similar to equation 10 from Zerrahn and Schill (2015):
             The sum of upwards and downwards shifts may not be greater than the
             (bigger) capacity limit.
+            Returns the constraint expressions keyed by (g, t).
             """
-            for t in m.TIMESTEPS:
-                for g in group:
+            exprs = {}
 
-                    if g.addition:
+            for g in groups_add:
+                capacity_max_g = capacity_max[g]
 
-                        # sum of load increases and reductions
-                        lhs = sum(self.dsm_up[g, h, t]
-                                  + self.balance_dsm_do[g, h, t]
-                                  + self.dsm_do_shift[g, h, t]
-                                  + self.balance_dsm_up[g, h, t]
-                                  for h in g.delay_time) \
-                              + self.dsm_do_shed[g, t]
+                # without any capacity, all variables are fixed to zero
+                # by the availability constraints already
+                for t in np.flatnonzero(capacity_max_arrs[g]).tolist():
+                    # sum of load increases and reductions
+                    lhs = total_up[g, t] + total_bal_do[g, t] \
+                          + total_do_shift[g, t] \
+                          + total_bal_up[g, t] \
+                          + dsm_do_shed[g, t]
 
-                        # maximum capacity eligibly for load shifting
-                        rhs = max(g.capacity_down[t],
-                                  g.capacity_up[t])
+                    # maximum capacity eligibly for load shifting
+                    rhs = capacity_max_g[t]
 
-                        # add constraint
-                        block.dr_logical_constraint.add((g, t), (lhs <= rhs))
+                    # add constraint
+                    exprs[g, t] = (lhs <= rhs)
 
-                    else:
-                        pass  # return(Constraint.Skip)
+            return exprs
 
-        self.dr_logical_constraint = Constraint(group, m.TIMESTEPS,
-                                                noruleinit=True)
-        self.dr_logical_constraint_build = BuildAction(
-            rule=dr_logical_constraint_rule)
+        # The constraint is only indexed by the (g, t) pairs actually used
+        # and initialised from the prebuilt expressions in one go
+        logical_exprs = dr_logical_constraint_exprs()
+        if logical_exprs:
+            self.dr_logical_constraint = Constraint(
+                list(logical_exprs),
+                rule=lambda block, g, t: logical_exprs[g, t])
 
     # Equation 4.23
     def _objective_expression(self):
@@ -935,18 +897,40 @@ class SinkDRBlock(SimpleBlock):
         """
         m = self.parent_block()
 
-        dr_cost = 0
+        timesteps = list(m.TIMESTEPS)
+        n_timesteps = len(timesteps)
+        dsm_up = self.dsm_up
+        dsm_do_shift = self.dsm_do_shift
+        dsm_do_shed = self.dsm_do_shed
+        balance_dsm_up = self.balance_dsm_up
+        balance_dsm_do = self.balance_dsm_do
+        linear_vars = []
+        linear_coefs = []
 
         # Costs only occur from initial shifting, not from balancing
-        for t in m.TIMESTEPS:
-            for g in self.DR:
-                dr_cost += sum(self.dsm_up[g, h, t]
-                               + self.balance_dsm_do[g, h, t]
-                               for h in g.delay_time) * g.cost_dsm_up
-                dr_cost += sum(self.dsm_do_shift[g, h, t]
-                               + self.balance_dsm_up[g, h, t]
-                               for h in g.delay_time) * g.cost_dsm_down_shift \
-                           + self.dsm_do_shed[g, t] * g.cost_dsm_down_shed
+        for g in self.DR:
+            delay_time = g.delay_time
+            cost_dsm_up = float(g.cost_dsm_up)
+            cost_dsm_down_shift = float(g.cost_dsm_down_shift)
+            cost_dsm_down_shed = float(g.cost_dsm_down_shed)
+            n_shift_terms = len(delay_time) * n_timesteps
+
+            for var, cost in ((dsm_up, cost_dsm_up),
+                              (balance_dsm_do, cost_dsm_up),
+                              (dsm_do_shift, cost_dsm_down_shift),
+                              (balance_dsm_up, cost_dsm_down_shift)):
+                # terms without costs do not contribute to the objective
+                if cost:
+                    linear_vars.extend(var[g, h, t] for h in delay_time
+                                       for t in timesteps)
+                    linear_coefs.extend([cost] * n_shift_terms)
+
+            if cost_dsm_down_shed:
+                linear_vars.extend(dsm_do_shed[g, t] for t in timesteps)
+                linear_coefs.extend([cost_dsm_down_shed] * n_timesteps)
+
+        dr_cost = LinearExpression(constant=0.0, linear_coefs=linear_coefs,
+                                   linear_vars=linear_vars)
 
         self.cost = Expression(expr=dr_cost)
 
@@ -966,8 +950,6 @@ class SinkDRInvestmentBlock(SinkDRBlock):
         if group is None:
             return None
 
-        m = self.parent_block()
-
         # for all DR components get inflow from bus_elec
         for n in group:
             n.inflow = list(n.inputs)[0]
@@ -984,8 +966,8 @@ class SinkDRInvestmentBlock(SinkDRBlock):
             """
             return g.investment.minimum, g.investment.maximum
 
-        # Investment in DR capacity
-        self.invest = Var(self.INVESTDR, m.TIMESTEPS, initialize=0,
+        # Investment in DR capacity (one value per unit, not per timestep)
+        self.invest = Var(self.INVESTDR, initialize=0,
                           within=NonNegativeReals,
                           bounds=_dr_investvar_bound_rule)
 
@@ -1002,14 +984,13 @@ class SinkDRInvestmentBlock(SinkDRBlock):
         if not hasattr(self, 'INVESTDR'):
             return 0
 
-        investment_costs = 0
-
         for n in self.INVESTDR:
-            if n.investment.ep_costs is not None:
-                investment_costs += self.invest[n] * n.investment.ep_costs
-            else:
+            if n.investment.ep_costs is None:
                 raise ValueError("Missing value for investment costs!")
 
+        investment_costs = quicksum(self.invest[n] * n.investment.ep_costs
+                                    for n in self.INVESTDR)
+
         self.investment_costs = Expression(expr=investment_costs)
 
         return investment_costs
\ No newline at end of file
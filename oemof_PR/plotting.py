@@ -7,12 +7,25 @@ import oemof.solph as solph
 import matplotlib.pyplot as plt
 import matplotlib.dates as mdates
 import matplotlib.ticker as ticker
-
+from matplotlib.collections import LineCollection, PolyCollection
+from matplotlib.lines import Line2D
+from matplotlib.patches import Patch
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+
+import functools
+import hashlib
 import os
 import pandas as pd
 import numpy as np
 from pandas.plotting import register_matplotlib_converters
 
+# optional dependency; only needed for downsampling long slices in plot_dsm
+try:
+    from tsdownsample import MinMaxLTTBDownsampler
+except ImportError:
+    MinMaxLTTBDownsampler = None
+
 # register matplotlib converters which have been overwritten by pandas
 register_matplotlib_converters()
 
@@ -20,24 +33,20 @@ register_matplotlib_converters()
 #################################################################
 
 def make_directory(folder_name):
-    existing_folders = next(os.walk('.'))[1]
-    if folder_name in existing_folders:
+    path = os.path.join('.', folder_name)
+    if os.path.isdir(path):
         print('----------------------------------------------------------')
         print('Folder "' + folder_name + '" already exists in current directory.')
         print('----------------------------------------------------------')
     else:
-        path = "./" + folder_name
-        os.mkdir(path)
+        os.makedirs(path)
         print('----------------------------------------------------------')
         print('Created folder "' + folder_name + '" in current directory.')
         print('----------------------------------------------------------')
 
 
-def adjust_yaxis(ax, ydif, v):
-    """shift axis ax by ydiff, maintaining point v at the same location"""
-    inv = ax.transData.inverted()
-    _, dy = inv.transform((0, 0)) - inv.transform((0, ydif))
-    miny, maxy = ax.get_ylim()
+def shifted_ylim(miny, maxy, dy, v):
+    """compute new y limits shifted by dy, maintaining point v (scalars only)"""
     miny, maxy = miny - v, maxy - v
     if -miny > maxy or (-miny == maxy and dy > 0):
         nminy = miny
@@ -45,7 +54,15 @@ def adjust_yaxis(ax, ydif, v):
     else:
         nmaxy = maxy
         nminy = maxy * (miny + dy) / (maxy + dy)
-    ax.set_ylim(nminy + v, nmaxy + v)
+    return nminy + v, nmaxy + v
+
+
+def adjust_yaxis(ax, ydif, v):
+    """shift axis ax by ydiff, maintaining point v at the same location"""
+    inv = ax.transData.inverted()
+    _, dy = inv.transform((0, 0)) - inv.transform((0, ydif))
+    miny, maxy = ax.get_ylim()
+    ax.set_ylim(*shifted_ylim(miny, maxy, dy, v))
 
 
 def align_yaxis(ax1, v1, ax2, v2):
@@ -56,6 +73,82 @@ def align_yaxis(ax1, v1, ax2, v2):
     adjust_yaxis(ax1, (y2 - y1) / 2, v1)
 
 
+def downsample_positions(arrays, n_out):
+    """Return the (sorted) positions to keep when downsampling arrays
+
+    MinMaxLTTB downsampling is applied to each array separately and the
+    positions selected are combined, so that all arrays can still be
+    plotted against one common x-axis. n_out is split evenly across the
+    arrays, so at most n_out positions are returned in total; if n_out
+    is too small for all of them (LTTB needs at least 3 points), only
+    the leading arrays are used.
+    """
+    if MinMaxLTTBDownsampler is None:
+        raise ImportError("Package 'tsdownsample' is needed in order to "
+                          "downsample data for plotting (max_points).")
+
+    arrays = arrays[:max(1, min(len(arrays), n_out // 3))]
+    n_out_per_array = n_out // len(arrays)
+
+    downsampler = MinMaxLTTBDownsampler()
+    positions = [downsampler.downsample(np.ascontiguousarray(y),
+                                        n_out=n_out_per_array)
+                 for y in arrays]
+
+    return np.unique(np.concatenate(positions))
+
+
+def get_slices(df, days):
+    """Return (start, slice) pairs splitting df into windows of days
+
+    For regular hourly data starting at midnight, slices are taken by
+    position which is much cheaper than resampling; for any other index,
+    resampling is used as a fallback.
+    """
+    index = df.index
+    step = days * 24
+    hourly = (len(index) > 1
+              and (np.diff(index.asi8) == pd.Timedelta(1, 'h').value).all())
+
+    if not hourly or index[0] != index[0].normalize():
+        return df.resample(str(days) + 'D')
+
+    return ((index[start], df.iloc[start:start + step])
+            for start in range(0, len(df), step))
+
+
+def step_vertices(x, y):
+    """Return the vertices of a step line (where='post') as (n, 2) array"""
+    y = np.broadcast_to(y, np.shape(x))
+    return np.column_stack((np.repeat(x, 2)[1:], np.repeat(y, 2)[:-1]))
+
+
+def add_step_fills(ax, x, bands, alpha):
+    """Add filled step bands (step='post') to ax as one PolyCollection
+
+    :param bands: list of tuples
+        (y1, y2, facecolor, label) for each band to fill between y1 and y2
+    :return: list of matplotlib.patches.Patch
+        legend handles (one per band)
+    """
+    polygons = []
+    facecolors = []
+    for y1, y2, facecolor, _ in bands:
+        polygon = np.concatenate((step_vertices(x, y2),
+                                  step_vertices(x, y1)[::-1]))
+        # bands with missing values (e.g. generators not included)
+        # are not drawn, but kept in the legend
+        if not np.isnan(polygon).any():
+            polygons.append(polygon)
+            facecolors.append(facecolor)
+
+    ax.add_collection(PolyCollection(polygons, facecolors=facecolors,
+                                     alpha=alpha, rasterized=True))
+
+    return [Patch(facecolor=facecolor, alpha=alpha, label=label)
+            for _, _, facecolor, label in bands]
+
+
 def extract_results(model, approach, **kwargs):
     """ Extract data from Pyomo variables in DataFrames and plot for visualization.
 
@@ -97,107 +190,117 @@ def extract_results(model, approach, **kwargs):
     # Generators coal
     if include_coal:
         df_coal_1 = bus_elec_seqs[
-            (('pp_coal_1', 'bus_elec'), 'flow')].rename('coal1', inplace=True)
+            (('pp_coal_1', 'bus_elec'), 'flow')]
+        df_coal_1.name = 'coal1'
     else:
-        df_coal_1 = pd.Series(index=bus_elec_seqs.index)
+        df_coal_1 = pd.Series(index=bus_elec_seqs.index, name='coal1',
+                              dtype=np.float64)
 
     if include_gas:
         df_gas_1 = bus_elec_seqs[
-            (('pp_gas_1', 'bus_elec'), 'flow')].rename('gas1', inplace=True)
+            (('pp_gas_1', 'bus_elec'), 'flow')]
+        df_gas_1.name = 'gas1'
     else:
-        df_gas_1 = pd.Series(index=bus_elec_seqs.index)
+        df_gas_1 = pd.Series(index=bus_elec_seqs.index, name='gas1',
+                             dtype=np.float64)
 
     # Generators RE
     df_wind = bus_elec_seqs[
-        (('wind', 'bus_elec'), 'flow')].rename('wind', inplace=True)
+        (('wind', 'bus_elec'), 'flow')]
+    df_wind.name = 'wind'
 
     df_pv = bus_elec_seqs[
-        (('pv', 'bus_elec'), 'flow')].rename('pv', inplace=True)
+        (('pv', 'bus_elec'), 'flow')]
+    df_pv.name = 'pv'
 
     # Shortage/Excess
     df_shortage = bus_elec_seqs[
-        (('shortage_el', 'bus_elec'), 'flow')].rename('shortage', inplace=True)
+        (('shortage_el', 'bus_elec'), 'flow')]
+    df_shortage.name = 'shortage'
 
     df_excess = bus_elec_seqs[
-        (('bus_elec', 'excess_el'), 'flow')].rename('excess', inplace=True)
+        (('bus_elec', 'excess_el'), 'flow')]
+    df_excess.name = 'excess'
 
     # ---------------- Extract DSM results (all approaches) ---------------------
     # Parts of results extraction is dependent on kwargs (might be removed later)
 
     # Demand after DSM
     df_demand_dsm = bus_elec_seqs[
-        (('bus_elec', 'demand_dsm'), 'flow')].rename('demand_dsm',
-                                                     inplace=True)
+        (('bus_elec', 'demand_dsm'), 'flow')]
+    df_demand_dsm.name = 'demand_dsm'
+
+    # Aggregate DSM sequences per variable in one pass; the variable names
+    # (2nd element of the column labels) are extracted only once.
+    # Variables not present in the results are filled with zeros
+    dsm_vars = np.array([column[1] for column in dsm_seqs.columns],
+                        dtype=object)
+    dsm_agg = dsm_seqs.groupby(dsm_vars, axis=1, sort=False).sum()
+    dsm_zeros = pd.Series(0.0, index=dsm_seqs.index)
 
     # Downwards shifts (shifting)
-    df_dsmdo_shift = dsm_seqs.iloc[:, dsm_seqs.columns.str[1]
-                                      == 'dsm_do_shift'].sum(
-        axis=1).rename('dsm_do_shift', inplace=True)
+    df_dsmdo_shift = dsm_agg.get('dsm_do_shift', dsm_zeros).rename(
+        'dsm_do_shift')
 
     # Downwards shifts (shedding)
-    df_dsmdo_shed = dsm_seqs.iloc[:, dsm_seqs.columns.str[1]
-                                     == 'dsm_do_shed'].sum(
-        axis=1).rename('dsm_do_shed', inplace=True)
+    df_dsmdo_shed = dsm_agg.get('dsm_do_shed', dsm_zeros).rename(
+        'dsm_do_shed')
 
     # Upwards shifts
-    df_dsmup = dsm_seqs.iloc[:, dsm_seqs.columns.str[1]
-                                == 'dsm_up'].sum(
-        axis=1).rename('dsm_up', inplace=True)
+    df_dsmup = dsm_agg.get('dsm_up', dsm_zeros).rename('dsm_up')
 
-    df_dsm_add = None
+    # Additional DSM results (list of series) dependent on approach
+    dsm_add = []
 
     # Get additional DSM results dependent on approach considered
     if approach == "DLR":
         # Original shift values
-        df_dsmdo_orig = df_dsmdo_shift.copy().rename('dsm_do_orig',
-                                                     inplace=True)
-        df_dsmup_orig = df_dsmup.copy().rename('dsm_up_orig',
-                                               inplace=True)
+        df_dsmdo_orig = df_dsmdo_shift.rename('dsm_do_orig')
+        df_dsmup_orig = df_dsmup.rename('dsm_up_orig')
 
         # Balacing values
-        df_dsmdo_bal = dsm_seqs.iloc[:, dsm_seqs.columns.str[1]
-                                    == 'balance_dsm_do'].sum(
-            axis=1).rename('balance_dsm_do', inplace=True)
-        df_dsmup_bal = dsm_seqs.iloc[:, dsm_seqs.columns.str[1]
-                                    == 'balance_dsm_up'].sum(
-            axis=1).rename('balance_dsm_up', inplace=True)
+        df_dsmdo_bal = dsm_agg.get('balance_dsm_do', dsm_zeros).rename(
+            'balance_dsm_do')
+        df_dsmup_bal = dsm_agg.get('balance_dsm_up', dsm_zeros).rename(
+            'balance_dsm_up')
 
         # DSM storage levels
-        df_dsmsldo = dsm_seqs.iloc[:, dsm_seqs.columns.str[1]
-                                        == 'dsm_do_level'].sum(
-            axis=1).rename('dsm_sl_do', inplace=True)
-        df_dsmslup = dsm_seqs.iloc[:, dsm_seqs.columns.str[1]
-                                        == 'dsm_up_level'].sum(
-            axis=1).rename('dsm_sl_up', inplace=True)
-
-        df_dsmdo_shift = df_dsmdo_orig.add(df_dsmup_bal).rename('dsm_do_shift',
-                                                                inplace=True)
-        df_dsmup = df_dsmup_orig.add(df_dsmdo_bal).rename('dsm_up',
-                                                          inplace=True)
-
-        df_dsm_add = pd.concat([df_dsmdo_orig, df_dsmup_orig,
-                                df_dsmdo_bal, df_dsmup_bal,
-                                df_dsmsldo, df_dsmslup], axis=1)
+        df_dsmsldo = dsm_agg.get('dsm_do_level', dsm_zeros).rename(
+            'dsm_sl_do')
+        df_dsmslup = dsm_agg.get('dsm_up_level', dsm_zeros).rename(
+            'dsm_sl_up')
+
+        df_dsmdo_shift = df_dsmdo_orig.add(df_dsmup_bal)
+        df_dsmdo_shift.name = 'dsm_do_shift'
+        df_dsmup = df_dsmup_orig.add(df_dsmdo_bal)
+        df_dsmup.name = 'dsm_up'
+
+        dsm_add = [df_dsmdo_orig, df_dsmup_orig,
+                   df_dsmdo_bal, df_dsmup_bal,
+                   df_dsmsldo, df_dsmslup]
 
     # Effective DSM shift (shifting only)
     df_dsm_tot = df_dsmdo_shift - df_dsmup
-    df_dsm_tot.rename('dsm_tot', inplace=True)
+    df_dsm_tot.name = 'dsm_tot'
 
     # DSM storage level
     df_dsm_acum = df_dsm_tot.cumsum()
-    df_dsm_acum.rename('dsm_acum', inplace=True)
+    df_dsm_acum.name = 'dsm_acum'
+
+    # DSM node (looked up only once)
+    dsm_node = next(_ for _ in model.NODES.data() if str(_) == 'demand_dsm')
 
     # Original demand before DSM
-    df_demand_el = [_ for _ in model.NODES.data() if str(_) == 'demand_dsm'][0].demand
-    df_demand_el.rename('demand_el', inplace=True)
+    df_demand_el = dsm_node.demand.reindex(bus_elec_seqs.index)
+    df_demand_el.name = 'demand_el'
 
     # Capacity limit for upshift
-    df_capup = [_ for _ in model.NODES.data() if str(_) == 'demand_dsm'][0].capacity_up
-    df_capup.rename('cap_up', inplace=True)
+    df_capup = dsm_node.capacity_up.reindex(bus_elec_seqs.index)
+    df_capup.name = 'cap_up'
 
     # Capacity limit for downshift
-    df_capdo = [_ for _ in model.NODES.data() if str(_) == 'demand_dsm'][0].capacity_down
-    df_capdo.rename('cap_do', inplace=True)
+    df_capdo = dsm_node.capacity_down.reindex(bus_elec_seqs.index)
+    df_capdo.name = 'cap_do'
 
     if invest:
         df_demand_el = df_demand_el.mul(dsm_invest)
@@ -210,15 +313,17 @@ def extract_results(model, approach, **kwargs):
         df_capdo = df_capdo.mul(kwargs.get('max_capacity_down', 1))
 
     # ####### Merge all data into one DataFrame
-    df_model = pd.concat([df_coal_1, df_gas_1, df_wind, df_pv, df_excess, df_shortage,
-                          df_demand_dsm, df_dsmdo_shift, df_dsmdo_shed, df_dsmup,
-                          df_dsm_tot, df_dsm_acum, df_demand_el,
-                          df_capup, df_capdo],
-                         axis=1)
-
-    # Add additional dsm values for certain approaches
-    if df_dsm_add is not None:
-        df_model = pd.concat([df_model, df_dsm_add], axis=1, sort=False)
+    # (including additional dsm values for certain approaches)
+    results = [df_coal_1, df_gas_1, df_wind, df_pv, df_excess, df_shortage,
+               df_demand_dsm, df_dsmdo_shift, df_dsmdo_shed, df_dsmup,
+               df_dsm_tot, df_dsm_acum, df_demand_el,
+               df_capup, df_capdo] + dsm_add
+
+    # All series share the model's timeindex (the input series of the dsm
+    # unit are reindexed above), so the frame is created directly from
+    # their values instead of aligning and concatenating them
+    data = {series.name: series.to_numpy() for series in results}
+    df_model = pd.DataFrame(data, index=bus_elec_seqs.index, copy=False)
 
     if invest:
         return df_model, dsm_invest
@@ -226,119 +331,260 @@ def extract_results(model, approach, **kwargs):
         return df_model
 
 
+@functools.lru_cache(maxsize=8)
+def _extract_results_memoized(model, approach, kwargs_items):
+    """ Memoized call of extract_results (kwargs given as sorted items) """
+    return extract_results(model, approach, **dict(kwargs_items))
+
+
+def _results_fingerprint(model):
+    """ Hash of the model results and dsm input data used by extract_results
+
+    Covers the bus_elec and demand_dsm sequences (incl. timeindex) as well
+    as the demand and capacity series of the dsm unit, so that a rebuilt or
+    re-solved model with other data yields another fingerprint.
+    """
+    digest = hashlib.md5()
+    for label in ['bus_elec', 'demand_dsm']:
+        seqs = solph.views.node(model.es.results['main'], label)['sequences']
+        digest.update(repr(list(seqs.columns)).encode())
+        digest.update(pd.util.hash_pandas_object(seqs).to_numpy().tobytes())
+
+    dsm_node = next(_ for _ in model.NODES.data() if str(_) == 'demand_dsm')
+    for series in [dsm_node.demand, dsm_node.capacity_up,
+                   dsm_node.capacity_down]:
+        digest.update(
+            pd.util.hash_pandas_object(pd.Series(series)).to_numpy().tobytes())
+
+    return digest.hexdigest()
+
+
+def _keyed_cache_file(cache_file, model, approach, kwargs_items):
+    """ Add a hash of results, approach and kwargs to the cache file name """
+    key = hashlib.md5(repr((_results_fingerprint(model), approach,
+                            kwargs_items)).encode()).hexdigest()
+    root, ext = os.path.splitext(cache_file)
+    return root + '_' + key[:12] + ext
+
+
+def extract_results_cached(model, approach, cache_file=None, **kwargs):
+    """ Cached variant of extract_results.
+
+    Results are memoized per model, approach and kwargs, so that repeated
+    calls (e.g. for several plots of the same model) do not walk the Pyomo
+    results again. The model results must not change in between.
+    Optionally, results are stored to resp. read from a parquet file. A hash
+    of the model results (see _results_fingerprint), approach and kwargs is
+    added to its name, so that results of another model run or for other
+    settings are not read by mistake. If no parquet engine (pyarrow or
+    fastparquet) is installed, only the in-memory cache is used.
+
+    Note that the in-memory cache keeps up to 8 models (incl. their results)
+    alive, and that all kwargs values must be hashable (e.g. use tuples
+    instead of lists).
+
+    :param model: oemof.solph.models.Model
+        The solved optimization model (including results)
+    :param approach: str
+        Must be one of ["DIW", "IER", "DLR", "TUD"]
+    :param cache_file: str
+        Path of a parquet file used as a persistent cache (optional)
+        (not used in investment mode, since dsm_invest is returned as well)
+    :return: df_model: pd.DataFrame
+        A pd.DataFrame containing the concatenated and renamed results sequences
+        (and dsm_invest in investment mode, see extract_results)
+    """
+    invest = kwargs.get('invest', False)
+    use_file = cache_file is not None and not invest
+
+    kwargs_items = tuple(sorted(kwargs.items()))
+    if use_file:
+        cache_file = _keyed_cache_file(cache_file, model, approach,
+                                       kwargs_items)
+        if os.path.isfile(cache_file):
+            try:
+                return pd.read_parquet(cache_file)
+            except ImportError:
+                # no parquet engine installed
+                use_file = False
+
+    results = _extract_results_memoized(model, approach, kwargs_items)
+
+    # return copies since the cached frame must not be altered
+    if invest:
+        df_model, dsm_invest = results
+        return df_model.copy(), dsm_invest
+
+    if use_file:
+        try:
+            results.to_parquet(cache_file)
+        except ImportError:
+            # no parquet engine installed
+            pass
+
+    return results.copy()
+
+
 def plot_dsm(df_gesamt, directory, project, days, **kwargs):
     """ Create a plot of DSM activity """
     figsize = kwargs.get('figsize', (15, 10))
     save = kwargs.get('save', False)
+    # resolution of saved figures (incl. rasterized fills; None: rc default)
+    dpi = kwargs.get('dpi', None)
     approach = kwargs.get('approach', None)
     include_approach = kwargs.get('include_approach', False)
     include_generators = kwargs.get('include_generators', False)
     ax1_ylim = kwargs.get('ax1_ylim', [-10, 250])
     ax2_ylim = kwargs.get('ax2_ylim', [-110, 150])
+    # maximum number of points plotted per slice (None: no downsampling)
+    max_points = kwargs.get('max_points', None)
+    # show each slice; if False, one figure is reused for all slices which
+    # is rendered with Agg only (no pyplot / GUI backend involved)
+    show = kwargs.get('show', True)
 
     # ############ DATA PREPARATION FOR FIGURE #############################
 
+    # Generators from model
+    # hierarchy for plot: wind, pv, coal, gas; the stacked bands are
+    # computed in one pass for the whole time horizon (not per slice)
+    graph_cols = ['graph_wind', 'graph_pv', 'graph_coal', 'graph_gas']
+    if include_generators:
+        df_gesamt = df_gesamt.assign(**dict(zip(graph_cols, np.cumsum(
+            df_gesamt[['wind', 'pv', 'coal1', 'gas1']].to_numpy().T,
+            axis=0))))
+
     # Create Figure
-    for info, slice in df_gesamt.resample(str(days) + 'D'):
+    fig = None
+    for info, slice in get_slices(df_gesamt, days):
+        date_repr = info.strftime('%Y-%m-%d')
+
+        # Downsample long slices for plotting (view only; data is unchanged)
+        if max_points is not None and len(slice) > max_points:
+            slice = slice.iloc[downsample_positions(
+                slice[['demand_el', 'demand_dsm', 'dsm_do_shift',
+                       'dsm_up', 'dsm_acum']].to_numpy().T,
+                max_points)]
+
+        # Extract the data to be plotted as numpy arrays once per slice
+        # (dates are converted to matplotlib's float format only once;
+        # y-values as float32 which is sufficient for plotting, x-values
+        # need float64 in order to resolve hours)
+        x = mdates.date2num(slice.index)
+        demand_el = slice['demand_el'].to_numpy(dtype=np.float32)
+        demand_dsm = slice['demand_dsm'].to_numpy(dtype=np.float32)
+        cap_up = slice['cap_up'].to_numpy(dtype=np.float32)
+        cap_do = slice['cap_do'].to_numpy(dtype=np.float32)
+        dsm_do_shift = slice['dsm_do_shift'].to_numpy(dtype=np.float32)
+        dsm_up = slice['dsm_up'].to_numpy(dtype=np.float32)
+        dsm_acum = slice['dsm_acum'].to_numpy(dtype=np.float32)
 
-        # Generators from model
-        # hierarchy for plot: wind, pv, coal, gas, shortage
         if include_generators:
-            graph_wind = slice.wind.values
-            graph_pv = graph_wind + slice.pv.values
-            graph_coal = graph_pv + slice.coal1.values
-            graph_gas = graph_coal + slice.gas1.values
-            graph_shortage = graph_gas + slice.shortage.values
+            graph_wind, graph_pv, graph_coal, graph_gas = \
+                slice[graph_cols].to_numpy(dtype=np.float32).T
 
         #################
         # first axis
-        fig, ax1 = plt.subplots(figsize=figsize)
+        if show or fig is None:
+            if show:
+                fig, ax1 = plt.subplots(figsize=figsize)
+            else:
+                fig = Figure(figsize=figsize)
+                FigureCanvasAgg(fig)
+                ax1 = fig.add_subplot(111)
+            ax2 = ax1.twinx()
+            if save:
+                fig.set_tight_layout(True)
+        else:
+            # Reuse the figure of the previous slice
+            ax1.cla()
+            ax2.cla()
+            # cla resets the layout of the twin axis
+            ax2.yaxis.tick_right()
+            ax2.yaxis.set_label_position('right')
+            ax2.patch.set_visible(False)
+
         ax1.set_ylim(ax1_ylim)
+        xticks = pd.date_range(start=date_repr, periods=days * 24, freq='H')
 
         # x-Axis date format
         ax1.xaxis_date()
         ax1.xaxis.set_major_formatter(mdates.DateFormatter('%d.%m - %H h'))  # ('%d.%m-%H h'))
         ax1.set_xlim(info - pd.Timedelta(1, 'h'), info + pd.Timedelta(days * 24 + 1, 'h'))
-        plt.xticks(pd.date_range(start=info._date_repr, periods=days * 24, freq='H'), rotation=90)
-
-        # Demands
-        # ax1.plot(range(timesteps), dsm, label='demand_DSM', color='black')
-        ax1.step(slice.index, slice.demand_el.values, where='post', label='Demand', linestyle='--', color='blue')
-        ax1.step(slice.index, slice.demand_dsm.values, where='post', label='Demand after DSM', color='black')
-
-        # DSM Capacity
-        ax1.step(slice.index, slice.demand_el + slice.cap_up, where='post', label='DSM Capacity', color='red',
-                 linestyle='--')
-        ax1.step(slice.index, slice.demand_el - slice.cap_do, where='post', color='red', linestyle='--')
-
-        # Generators
+        ax1.set_xticks(xticks)
+        ax1.tick_params(axis='x', labelrotation=90)
+
+        # Demands and DSM capacity (drawn as one collection of step lines)
+        ax1.add_collection(LineCollection(
+            [step_vertices(x, demand_el), step_vertices(x, demand_dsm),
+             step_vertices(x, demand_el + cap_up),
+             step_vertices(x, demand_el - cap_do)],
+            colors=['blue', 'black', 'red', 'red'],
+            linestyles=['--', '-', '--', '--']))
+        ax1_handles = [
+            Line2D([], [], linestyle='--', color='blue', label='Demand'),
+            Line2D([], [], color='black', label='Demand after DSM'),
+            Line2D([], [], linestyle='--', color='red', label='DSM Capacity')]
+
+        # Generators (drawn as one collection of filled bands)
         if include_generators:
-            ax1.fill_between(slice.index, 0, graph_wind, step='post', label='Wind', facecolor='darkcyan', alpha=0.5)
-            ax1.fill_between(slice.index, graph_wind, graph_pv, step='post', label='PV', facecolor='gold', alpha=0.5)
-            ax1.fill_between(slice.index, graph_pv, graph_coal, step='post', label='Coal', facecolor='black', alpha=0.5)
-            ax1.fill_between(slice.index, graph_coal, graph_gas, step='post', label='Gas', facecolor='brown', alpha=0.5)
+            ax1_handles += add_step_fills(
+                ax1, x, [(0, graph_wind, 'darkcyan', 'Wind'),
+                         (graph_wind, graph_pv, 'gold', 'PV'),
+                         (graph_pv, graph_coal, 'black', 'Coal'),
+                         (graph_coal, graph_gas, 'brown', 'Gas')],
+                alpha=0.5)
 
-        ax1.legend(bbox_to_anchor=(0., 1.1, 1., .102), loc=3, ncol=4, mode="expand", borderaxespad=0.)
+        ax1.legend(handles=ax1_handles, bbox_to_anchor=(0., 1.1, 1., .102), loc=3, ncol=4, mode="expand", borderaxespad=0.)
 
         # plt.xticks(range(0,timesteps,5))
 
-        plt.grid()
+        ax1.grid(True)
 
         ###########################
         # Second axis
-        ax2 = ax1.twinx()
         ax2.xaxis_date()
         ax2.xaxis.set_major_formatter(mdates.DateFormatter('%d.%m - %H h'))  # ('%d.%m-%H h'))
         ax2.set_xlim(info - pd.Timedelta(1, 'h'), info + pd.Timedelta(days * 24 + 1, 'h'))
-        plt.xticks(pd.date_range(start=info._date_repr, periods=days * 24, freq='H'), rotation=90)
+        ax2.set_xticks(xticks)
+        ax2.tick_params(axis='x', labelrotation=90)
 
         ax2.set_ylim(ax2_ylim)
 
-        ax2.fill_between(slice.index, 0, -slice.dsm_do_shift,
-                         step='post',
-                         label='DSM_down_shift',
-                         facecolor='red',
-                         # hatch='.',
-                         alpha=0.3)
-        ax2.fill_between(slice.index, -slice.dsm_do_shift,
-                         -(slice.dsm_do_shift + slice.dsm_do_shed),
-                         step='post',
-                         label='DSM_down_shed',
-                         facecolor='blue',
-                         # hatch='.',
-                         alpha=0.3)
-        ax2.fill_between(slice.index, 0, slice.dsm_up,
-                         step='post',
-                         label='DSM_up',
-                         facecolor='green',
-                         # hatch='.',
-                         alpha=0.3)
-        ax2.plot(slice.index, slice.dsm_acum,
-                 linestyle='none',
-                 markersize=8,
-                 marker="D",
-                 color="dimgrey",
-                 fillstyle='none',
-                 drawstyle="steps-post",
-                 label='DSM acum',
-                 )
+        # DSM up/down (drawn as one collection of filled bands)
+        dsm_bands = [(0, -dsm_do_shift, 'red', 'DSM_down_shift')]
+        dsm_do_shed = slice['dsm_do_shed'].to_numpy(dtype=np.float32)
+        dsm_bands.append((-dsm_do_shift, -(dsm_do_shift + dsm_do_shed),
+                          'blue', 'DSM_down_shed'))
+        dsm_bands.append((0, dsm_up, 'green', 'DSM_up'))
+        ax2_handles = add_step_fills(ax2, x, dsm_bands, alpha=0.3)
+
+        acum_line, = ax2.plot(x, dsm_acum,
+                              linestyle='none',
+                              markersize=8,
+                              marker="D",
+                              color="dimgrey",
+                              fillstyle='none',
+                              drawstyle="steps-post",
+                              label='DSM acum')
+        ax2_handles.append(acum_line)
 
         # Legend axis 2
-        ax2.legend(bbox_to_anchor=(0., -0.3, 1., 0.102), loc=3, ncol=3, borderaxespad=0., mode="expand")
+        ax2.legend(handles=ax2_handles, bbox_to_anchor=(0., -0.3, 1., 0.102), loc=3, ncol=3, borderaxespad=0., mode="expand")
         ax1.set_xlabel('Time t in h')
         ax1.set_ylabel('MW')
         ax2.set_ylabel('$\Delta$ MW')
 
         if approach is not None:
-            plt.title(approach)
+            ax2.set_title(approach)
 
-        plt.show()
+        if show:
+            plt.show()
 
         if save:
-            fig.set_tight_layout(True)
-            name = 'Plot_' + project + '_' + info._date_repr + '.png'
+            name = 'Plot_' + project + '_' + date_repr + '.png'
             if include_approach:
-                name = 'Plot_' + project + '_' + approach + '_' + info._date_repr + '.png'
-            fig.savefig(directory + 'graphics/' + name)
-            plt.close()
+                name = 'Plot_' + project + '_' + approach + '_' + date_repr + '.png'
+            fig.savefig(directory + 'graphics/' + name, dpi=dpi)
+            if show:
+                plt.close(fig)
             print(name + ' saved.')